@@ -0,0 +1,146 @@
+"""
+End-to-end time of `RepoGen.main` for synthetic accounts served by bench/stub_server.py.
+
+    $ python bench/bench_e2e.py --sizes 100,1000,10000 --latency 0.01 --runs 2
+
+Each size gets a fresh workspace, the first run is a full sync and the following ones are incremental.
+Nothing is deployed. `--json FILE` saves the metrics of every run, to compare them across versions.
+With `--accounts N`, N accounts served the same submissions are published by one process, the stage
+times and requests of all of them are added up.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from contextlib import redirect_stdout
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH, os.pardir)
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+import app  # noqa: E402
+from leetcode import User  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_stub(args, size):
+    """Run the stub server in a process of its own, so that it does not compete with the publisher for the GIL"""
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, os.path.join(BENCH, 'stub_server.py'), '--port', str(port),
+                             '--submissions', str(size), '--latency', str(args.latency), '--jitter', str(args.jitter),
+                             '--error-rate', str(args.error_rate), '--max-limit', str(args.max_limit)],
+                            stdout=subprocess.DEVNULL)
+    url = 'http://127.0.0.1:%d' % port
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url + '/_stats').close()
+            return proc, url
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('stub server did not start')
+
+
+def merge_reports(reports, seconds):
+    """Metrics of the accounts published by one run, the stages and requests of every account added up"""
+    endpoints = {}
+    stages = {}
+    for report in reports:
+        for stage, stage_seconds in report['stages'].items():
+            stages[stage] = round(stages.get(stage, 0) + stage_seconds, 3)
+        for endpoint, stats in report['endpoints'].items():
+            total = endpoints.setdefault(endpoint, {'requests': 0, 'retries': 0})
+            total['requests'] += stats['requests']
+            total['retries'] += stats['retries']
+    return {'seconds': seconds, 'stages': stages, 'endpoints': endpoints, 'accounts': reports}
+
+
+def run(conf, workspace):
+    """One run of the publisher in `workspace`, return its metrics"""
+    app.LP_PREFIX = workspace
+    handlers = list(logging.getLogger().handlers)
+    start = time.time()
+    try:
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, redirect_stdout(devnull):
+            if conf.get('accounts'):
+                metrics = app.Metrics()
+                results = app.publish_accounts(conf, metrics)
+                reports = [metrics.report()] + [rg.metrics.report() for rg in results]
+                return merge_reports(reports, round(time.time() - start, 3))
+            rg = app.RepoGen(conf)
+            rg.main()
+    finally:
+        # `RepoGen.logger` adds handlers on every run
+        logging.getLogger().handlers = handlers
+    return rg.metrics.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000', help='submissions of the synthetic accounts')
+    parser.add_argument('--runs', type=int, default=2, help='runs of each account, the first one is a full sync')
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-limit', type=int, default=20, help='max submissions of a page served by the stub')
+    parser.add_argument('--page-size', type=int, default=20, help='submissions of a page requested by a full sync')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--pipeline', action='store_true')
+    parser.add_argument('--accounts', type=int, default=0,
+                        help='publish this many accounts of the same submissions in one process')
+    parser.add_argument('--account-workers', type=int, default=4)
+    parser.add_argument('--json', help='file the metrics of every run are saved to')
+    args = parser.parse_args()
+
+    conf = {
+        'account': {'domain': 'en', 'user': 'stub', 'password': 'stub'},
+        'fetch': {'workers': args.workers, 'rate': 0, 'page_size': args.page_size},
+        'render': {'jobs': args.jobs},
+        'pipeline': {'enabled': args.pipeline},
+    }
+    if args.accounts:
+        conf['accounts'] = [{'name': 'stub%d' % i,
+                             'account': {'domain': 'en', 'user': 'stub%d' % i, 'password': 'stub'}, 'repo': []}
+                            for i in range(args.accounts)]
+        conf['account_workers'] = args.account_workers
+    results = []
+    print('%-7s %-4s %9s %9s %8s  %s' % ('subs', 'run', 'seconds', 'requests', 'retries', 'stages'))
+    for size in map(int, args.sizes.split(',')):
+        proc, url = start_stub(args, size)
+        User.DOMAIN_EN = User.DOMAIN_CN = url
+        workspace = tempfile.mkdtemp(prefix='lp-bench-')
+        try:
+            for name in ('templ', '_source'):
+                shutil.copytree(os.path.join(ROOT, name), os.path.join(workspace, name))
+            os.makedirs(os.path.join(workspace, '_cache'))
+            for i in range(args.runs):
+                report = run(conf, workspace)
+                endpoints = report['endpoints'].values()
+                print('%-7d %-4d %9.2f %9d %8d  %s' % (
+                    size, i + 1, report['seconds'], sum(e['requests'] for e in endpoints),
+                    sum(e['retries'] for e in endpoints),
+                    ' '.join('%s=%.2f' % stage for stage in report['stages'].items())), flush=True)
+                results.append(dict(report, submissions=size, run=i + 1))
+        finally:
+            proc.kill()
+            proc.wait()
+            shutil.rmtree(workspace, ignore_errors=True)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
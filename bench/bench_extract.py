@@ -0,0 +1,77 @@
+"""
+Parse time and allocations of the submission detail and notes pages, before and after `extract`.
+
+    $ python bench/bench_extract.py
+"""
+import json
+import os
+import re
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+import extract  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def legacy_submission_detail(html):
+    """`User.solution` before `extract`, one `re.findall` per field and one `str.replace` per escape"""
+    title = re.findall(r'<a class="inline-wrap" href="\S+?">(.+?)</a>', html) or None
+    if title:
+        title = title[0]
+    runtime = re.findall(r"runtime: '(\d+)',", html) or None
+    if runtime:
+        runtime = int(runtime[0])
+    memory = re.findall(r"memory: '(\d+(?:\.\d+)* \S*B)'", html) or None
+    if memory:
+        memory = memory[0]
+    language = re.findall(r"getLangDisplay: '(\S+?)',", html)[0]
+    code = re.findall(r"submissionCode: '(.+?)',\n", html)[0]
+    for ch in set(re.findall(r'\\u\w{4}', code)):
+        code = code.replace(ch, ch.encode('utf-8').decode('unicode-escape'))
+    title_slug = re.findall(r"editCodeUrl: '\S*?/problems/(\S+?)/'", html)[0]
+    runtime_distribution = re.findall(r"runtimeDistributionFormatted: '({.*?})'", html)
+    if runtime_distribution:
+        runtime_distribution = runtime_distribution[0]
+        for ch in set(re.findall(r'\\u\w{4}', runtime_distribution)):
+            runtime_distribution = runtime_distribution.replace(ch, ch.encode('utf-8').decode('unicode-escape'))
+        runtime_distribution = json.loads(runtime_distribution)
+    return {'title': title, 'runtime': runtime, 'memory': memory, 'language': language, 'code': code,
+            'title_slug': title_slug, 'runtime_distribution': runtime_distribution or None}
+
+
+def legacy_notes(html):
+    notes = re.findall(r"^\s*notes: JSON\.parse\('(.*)'\)\s*$", html, re.M)[0]
+    for ch in set(re.findall(r'\\u\w{4}', notes)):
+        notes = notes.replace(ch, ch.encode('utf-8').decode('unicode-escape'))
+    return json.loads(notes)
+
+
+def measure(func, html, number):
+    seconds = min(timeit.repeat(lambda: func(html), number=number, repeat=3)) / number
+    tracemalloc.start()
+    func(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    cases = [
+        ('submission_detail.html', legacy_submission_detail, extract.submission_detail, 1000),
+        ('notes.html', legacy_notes, extract.notes, 3),
+    ]
+    print('%-24s %-8s %12s %14s' % ('fixture', 'parser', 'us/page', 'peak alloc KB'))
+    for fixture, legacy, current, number in cases:
+        with open(os.path.join(FIXTURES, fixture), encoding='utf-8') as f:
+            html = f.read()
+        assert legacy(html) == current(html), fixture
+        for name, func in (('before', legacy), ('after', current)):
+            seconds, peak = measure(func, html, number)
+            print('%-24s %-8s %12.1f %14.1f' % (fixture, name, seconds * 1e6, peak / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Cold start of a scheduled run with nothing new to publish, with and without the fast path of src/fastpath.py.
+
+    $ python bench/bench_noop.py --submissions 1000 --runs 5
+
+Each mode gets a workspace with a copy of src, templ and _source that is published once. Then every run is a
+new process doing what `python src/app.py` does, against bench/stub_server.py. Nothing is deployed.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH, os.pardir)
+sys.path.insert(0, BENCH)
+from bench_e2e import start_stub  # noqa: E402
+
+# modules a run with nothing new should not import
+HEAVY = ('yaml', 'jinja2', 'requests', 'multiprocessing')
+# `python src/app.py` of the workspace, with leetcode served by the stub
+CHILD = '''
+import json, sys
+src, url = sys.argv[1:3]
+sys.argv = sys.argv[:1]
+sys.path.insert(0, src)
+import leetcode
+leetcode.User.DOMAIN_EN = leetcode.User.DOMAIN_CN = url
+import app
+app._main()
+sys.stderr.write(json.dumps([m for m in %r if m in sys.modules]))
+''' % (HEAVY,)
+
+
+def stats(url):
+    with urllib.request.urlopen(url + '/_stats') as r:
+        return json.load(r)
+
+
+def workspace(fast_path):
+    path = tempfile.mkdtemp(prefix='lp-noop-')
+    for name in ('src', 'templ', '_source'):
+        shutil.copytree(os.path.join(ROOT, name), os.path.join(path, name),
+                        ignore=shutil.ignore_patterns('__pycache__'))
+    conf = {
+        'account': {'domain': 'en', 'user': 'stub', 'password': 'stub'},
+        'fetch': {'rate': 0, 'fast_path': fast_path},
+    }
+    # json is yaml
+    with open(os.path.join(path, 'config.yml'), 'w', encoding='utf-8') as f:
+        json.dump(conf, f)
+    return path
+
+
+def run(path, url):
+    """One run in a new process, return its seconds, the requests it sent and the heavy modules it imported"""
+    before = stats(url)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', CHILD, os.path.join(path, 'src'), url],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    seconds = time.perf_counter() - start
+    after = stats(url)
+    requests = sum(after.values()) - sum(before.values()) - 1
+    return seconds, requests, json.loads(proc.stderr.decode('utf-8').splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--submissions', type=int, default=1000, help='submissions of the synthetic account')
+    parser.add_argument('--runs', type=int, default=5, help='runs with nothing new of each mode')
+    parser.add_argument('--latency', type=float, default=0.005)
+    args = parser.parse_args()
+    stub_args = argparse.Namespace(latency=args.latency, jitter=0.0, error_rate=0.0, max_limit=20)
+
+    proc, url = start_stub(stub_args, args.submissions)
+    paths = []
+    try:
+        print('%-10s %8s %9s %9s  %s' % ('mode', 'runs', 'seconds', 'requests', 'imported'))
+        for mode, fast_path in (('fast path', True), ('full run', False)):
+            path = workspace(fast_path)
+            paths.append(path)
+            # the first publication
+            run(path, url)
+            results = [run(path, url) for _ in range(args.runs)]
+            print('%-10s %8d %9.3f %9d  %s' % (
+                mode, args.runs, statistics.median(seconds for seconds, _, _ in results),
+                max(requests for _, requests, _ in results),
+                ','.join(sorted(set().union(*(imported for _, _, imported in results)))) or '-'), flush=True)
+    finally:
+        proc.kill()
+        proc.wait()
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
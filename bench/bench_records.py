@@ -0,0 +1,62 @@
+"""
+Construction time and memory of the submissions of a large account, as dicts and as `records`.
+
+    $ python bench/bench_records.py [rows]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+from records import Solution, Submission  # noqa: E402
+
+
+def submission_rows(n):
+    """Rows as read from table submission, without the code"""
+    return [(None, '{}', 100000 + i, 'Not Pending', ('cpp', 'java', 'python3')[i % 3], '%.1f MB' % (10 + i % 7),
+             '%d ms' % (i % 300), ('Accepted', 'Wrong Answer')[i % 2], 1500000000 + i, 'Problem %d' % (i % 2000),
+             '/submissions/detail/%d/' % (100000 + i)) for i in range(n)]
+
+
+def solution_rows(n):
+    return [(100000 + i, 'problem-%d' % (i % 2000), 'Problem %d' % (i % 2000), 'cpp', 'cpp', i % 300,
+             '%.1f MB' % (10 + i % 7), 85.5, None, 1500000000 + i, 'Accepted', '{}', 'Not Pending',
+             '/submissions/detail/%d/' % (100000 + i)) for i in range(n)]
+
+
+def as_dicts(columns):
+    """How `Dao` built its rows before `records`"""
+    return lambda rows: [dict(zip(columns, row)) for row in rows]
+
+
+def as_records(cls):
+    return lambda rows: [cls.from_row(row) for row in rows]
+
+
+def measure(build, rows):
+    seconds = min(timeit.repeat(lambda: build(rows), number=1, repeat=5))
+    tracemalloc.start()
+    objs = build(rows)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objs
+    return seconds, retained
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    cases = [
+        ('submission', submission_rows(n), Submission),
+        ('solution', solution_rows(n), Solution),
+    ]
+    print('%d rows' % n)
+    print('%-12s %-8s %12s %14s %12s' % ('type', 'as', 'ms', 'retained KB', 'bytes/row'))
+    for name, rows, cls in cases:
+        for kind, build in (('dict', as_dicts(cls.__slots__)), ('record', as_records(cls))):
+            seconds, retained = measure(build, rows)
+            print('%-12s %-8s %12.1f %14.1f %12.1f' % (name, kind, seconds * 1e3, retained / 1024, retained / n))
+
+
+if __name__ == '__main__':
+    main()
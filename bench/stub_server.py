@@ -0,0 +1,274 @@
+"""
+Local stand-in for LeetCode serving a synthetic account, so that benchmarks do not depend on the live site.
+
+    $ python bench/stub_server.py --submissions 1000 --latency 0.02 --error-rate 0.01
+
+The submission detail and notes pages are the recorded ones in bench/fixtures with the data of the
+synthetic account put in. Every response is delayed by `--latency` seconds (+/- `--jitter`), and a
+`--error-rate` fraction of them fails with `--error-status`. GET /_stats returns the requests served.
+With `--check-sessions`, pages of the account are redirected to the login page unless the session cookie is one
+given by a login, like LeetCode does for a revoked session.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+LANGS = ('python3', 'cpp', 'java', 'golang')
+STATUSES = ('Accepted', 'Accepted', 'Wrong Answer', 'Time Limit Exceeded')
+# pages that need a session
+PRIVATE = re.compile(r'/api/submissions/|/submissions/detail/\d+/|/notes/|/api/problems/all/')
+
+
+def js_escape(s):
+    """Escape a string like the javascript literals of LeetCode pages"""
+    return ''.join(c if c.isascii() and (c.isalnum() or c in ' .,:;()[]+-*/=<>_') else '\\u%04x' % ord(c) for c in s)
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class Account:
+    """Synthetic account with `submissions` submissions of `submissions // 4` questions, newest first"""
+
+    def __init__(self, submissions, seed=0):
+        rand = random.Random(seed)
+        count = max(5, submissions // 4)
+        self.questions = [{
+            'questionId': str(i + 1),
+            'questionFrontendId': str(i + 1),
+            'title': 'Problem %d' % (i + 1),
+            'titleSlug': 'problem-%d' % (i + 1),
+            'content': '<p>%s</p>' % ' '.join('word%d' % rand.randrange(1000) for _ in range(300)),
+            'translatedTitle': '问题 %d' % (i + 1),
+            'translatedContent': '<p>%s</p>' % ('内容' * 200),
+            'difficulty': ('Easy', 'Medium', 'Hard')[i % 3],
+            'likes': rand.randrange(10000),
+            'dislikes': rand.randrange(1000),
+            'similarQuestions': '[]',
+            'stats': json.dumps({'acRate': '%.1f%%' % rand.uniform(20, 80)}),
+            'status': 'ac',
+            'isPaidOnly': False,
+            'topicTags': [{'name': 'Array', 'slug': 'array', 'translatedName': '数组'},
+                          {'name': 'Hash Table', 'slug': 'hash-table', 'translatedName': '哈希表'}][:1 + i % 2],
+            'codeSnippets': [{'lang': lang, 'langSlug': lang, 'code': 'class Solution:\n    pass\n' * 20}
+                             for lang in LANGS],
+        } for i in range(count)]
+        self.submissions = []
+        for i in range(submissions):
+            question = self.questions[rand.randrange(count)]
+            self.submissions.append({
+                'id': 100000 + i,
+                'title': question['title'],
+                'lang': rand.choice(LANGS),
+                'status_display': rand.choice(STATUSES),
+                'timestamp': 1500000000 + i * 600,
+                'runtime': '%d ms' % rand.randrange(4, 300),
+                'memory': '%.1f MB' % rand.uniform(10, 40),
+                'code': '# 解法 %d\nclass Solution:\n    def solve(self, nums):\n\treturn %d\n' % (i, i),
+                'compare_result': '111',
+                'is_pending': 'Not Pending',
+                'url': '/submissions/detail/%d/' % (100000 + i),
+            })
+        self.submissions.reverse()
+        self.by_id = {s['id']: s for s in self.submissions}
+        self.slug_of = {q['title']: q['titleSlug'] for q in self.questions}
+        self.by_slug = {q['titleSlug']: q for q in self.questions}
+        self.notes = [{'question': {'titleSlug': q['titleSlug'], 'questionId': q['questionId']},
+                       'content': '笔记 of %s' % q['title']} for q in self.questions[::10]]
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, account, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, max_limit=20,
+                 check_sessions=False):
+        super().__init__(address, StubHandler)
+        self.check_sessions = check_sessions
+        self.account = account
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_limit = max_limit
+        self.stats = {}
+        self.lock = threading.Lock()
+        # tokens of the sessions given by logins, clear it to revoke them
+        self.sessions = set()
+        detail = fixture('submission_detail.html')
+        for name, marker in (('getLangDisplay', 'LANG'), ('submissionCode', 'CODE'), ('editCodeUrl', 'URL'),
+                             ('runtime', 'RUNTIME'), ('memory', 'MEMORY')):
+            detail = re.sub(r"^(\s*%s: )'.*'," % name, r"\1'@@%s@@'," % marker, detail, count=1, flags=re.M)
+        self.detail = re.sub(r'(<a class="inline-wrap" href=")\S+?(">).+?(</a>)', r'\1@@URL@@\2@@TITLE@@\3', detail)
+        self.notes = re.sub(r"^(\s*notes: JSON\.parse\(').*('\))", r'\1@@NOTES@@\2', fixture('notes.html'),
+                            count=1, flags=re.M)
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send headers and body in one segment, otherwise delayed ACKs add ~40ms to every response
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, body, content_type='application/json', status=200, headers=()):
+        body = body.encode('utf-8')
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.command == 'GET' and status == 200 and self.headers.get('If-None-Match') == etag:
+            status, body = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'csrftoken=stub; Path=/')
+        if self.command == 'GET':
+            self.send_header('ETag', etag)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_one(self, routes):
+        server = self.server
+        path = urlparse(self.path).path
+        server.count(re.sub(r'\d+', 'N', path))
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if not path.startswith('/_') and random.random() < server.error_rate:
+            server.count('errors')
+            return self.send('{}', status=server.error_status, headers=[('Retry-After', '0')])
+        if server.check_sessions and PRIVATE.fullmatch(path) and self.session() not in server.sessions:
+            return self.send('', 'text/html', 302, headers=[('Location', '/accounts/login/?next=%s' % path)])
+        for pattern, route in routes:
+            m = re.fullmatch(pattern, path)
+            if m:
+                return route(*m.groups())
+        self.send('{}', status=404)
+
+    def do_GET(self):
+        self.handle_one([
+            ('/', self.home),
+            ('/accounts/login/', lambda: self.send('<form id="login"></form>', 'text/html')),
+            ('/_stats', lambda: self.send(json.dumps(self.server.stats))),
+            ('/api/submissions/', self.submissions),
+            (r'/submissions/detail/(\d+)/', self.detail),
+            ('/notes/', self.notes),
+            ('/api/problems/all/', self.summary),
+        ])
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.handle_one([
+            ('/accounts/login/', self.login),
+            ('/graphql', lambda: self.graphql(json.loads(body or b'{}'))),
+        ])
+
+    def session(self):
+        cookie = SimpleCookie(self.headers.get('Cookie') or '').get('LEETCODE_SESSION')
+        return cookie and cookie.value
+
+    def home(self):
+        self.send('<script>window.NREUM={xpid:"stub=="}</script>', 'text/html')
+
+    def login(self):
+        token = hashlib.md5(str(random.random()).encode()).hexdigest()
+        self.server.sessions.add(token)
+        self.send('{}', headers=[('Set-Cookie', 'LEETCODE_SESSION=%s; Path=/; Max-Age=1209600' % token)])
+
+    def submissions(self):
+        query = parse_qs(urlparse(self.path).query)
+        offset = int(query.get('offset', ['0'])[0])
+        limit = min(int(query.get('limit', ['20'])[0]), self.server.max_limit)
+        rows = self.server.account.submissions[offset:offset + limit]
+        self.send(json.dumps({'submissions_dump': rows, 'has_next': offset + limit < len(
+            self.server.account.submissions), 'last_key': 'key%d' % (offset + limit)}))
+
+    def detail(self, submission_id):
+        submission = self.server.account.by_id.get(int(submission_id))
+        if submission is None:
+            return self.send('', 'text/html', 404)
+        slug = self.server.account.slug_of[submission['title']]
+        page = self.server.detail
+        for marker, value in (('LANG', submission['lang']), ('CODE', js_escape(submission['code'])),
+                              ('URL', '/problems/%s/' % slug), ('RUNTIME', submission['runtime'].split()[0]),
+                              ('MEMORY', submission['memory']), ('TITLE', submission['title'])):
+            page = page.replace('@@%s@@' % marker, value)
+        self.send(page, 'text/html')
+
+    def notes(self):
+        self.send(self.server.notes.replace('@@NOTES@@', js_escape(json.dumps(self.server.account.notes))),
+                  'text/html')
+
+    def summary(self):
+        account = self.server.account
+        self.send(json.dumps({
+            'user_name': 'stub', 'num_solved': len(account.questions), 'num_total': len(account.questions),
+            'ac_easy': 0, 'ac_medium': 0, 'ac_hard': 0,
+            'stat_status_pairs': [{'stat': {'question_id': int(q['questionId']), 'question__title': q['title'],
+                                            'question__title_slug': q['titleSlug'],
+                                            'frontend_question_id': int(q['questionFrontendId'])},
+                                   'status': 'ac', 'difficulty': {'level': 1}, 'paid_only': False}
+                                  for q in account.questions],
+        }))
+
+    def graphql(self, payload):
+        query, variables = payload.get('query', ''), payload.get('variables') or {}
+        account = self.server.account
+        if 'allQuestions' in query:
+            fields = ('title', 'titleSlug', 'translatedTitle', 'questionId', 'questionFrontendId', 'status',
+                      'difficulty', 'isPaidOnly')
+            data = {'allQuestions': [{name: q[name] for name in fields} for q in account.questions]}
+            return self.send(json.dumps({'data': data}))
+        # only the fields named in the query, like a real graphql server
+        names = set(re.findall(r'\w+', query))
+        data = {}
+        for alias, variable in re.findall(r'(\w+):\s*question\(titleSlug:\s*\$(\w+)\)', query) or [
+                ('question', 'titleSlug')]:
+            question = account.by_slug.get(variables.get(variable))
+            data[alias] = question and {name: value for name, value in question.items() if name in names}
+            if question and 'note' in names:
+                data[alias]['note'] = ''
+        self.send(json.dumps({'data': data}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--submissions', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds each response is delayed')
+    parser.add_argument('--jitter', type=float, default=0.0, help='max random seconds added to or taken from it')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of the responses that fail')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--max-limit', type=int, default=20, help='max submissions of a page')
+    parser.add_argument('--check-sessions', action='store_true',
+                        help='redirect pages of the account to the login page without a session given by a login')
+    args = parser.parse_args()
+    server = StubServer(('127.0.0.1', args.port), Account(args.submissions, args.seed), args.latency, args.jitter,
+                        args.error_rate, args.error_status, args.max_limit, args.check_sessions)
+    print('Serving %d submissions on %s' % (args.submissions, server.url), flush=True)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,34 @@
+import argparse
+import cProfile
 import glob
+import hashlib
 import json
 import logging
 import os
+import random
 import re
 import shutil
 import sqlite3
-import subprocess
 import sys
-from collections import defaultdict
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 
-import yaml
-from jinja2 import Template
-
+# yaml, jinja2 and requests are imported once a run goes on, `fastpath` tells whether it has to
+import fastpath
 from dao import Dao
+from deploy import GitDeployer
+from httpcache import ResponseCache
+from metrics import Metrics, timed
+from pipeline import Pipeline
+from session import SessionStore
 
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
-from leetcode import UserCN, UserEN
+from leetcode import QUESTION_FIELDS, UserCN, UserEN
+from records import CatalogEntry, Question, Record, Solution, Submission
 
 LP_PREFIX = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
 
@@ -28,48 +40,322 @@ def console(*args, **kwargs):
     print(*args, **kwargs)
 
 
+def to_json(obj):
+    """`default` of json.dumps, records are dumped as their fields"""
+    if isinstance(obj, Record):
+        return obj.as_dict()
+    return str(obj)
+
+
+def hash_of(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=to_json).encode('utf-8')).hexdigest()
+
+
+def write_atomic(filename, text):
+    """Write to a temporary file first, so `filename` is never left half written"""
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_file, filename)
+
+
+def dump_json(obj, filename):
+    write_atomic(filename, json.dumps(obj))
+
+
+def copy_if_changed(src, dst):
+    """Copy `src` to `dst` unless they have the same size and time, return whether it is copied"""
+    if os.path.isfile(dst):
+        src_stat, dst_stat = os.stat(src), os.stat(dst)
+        if src_stat.st_size == dst_stat.st_size and int(src_stat.st_mtime) == int(dst_stat.st_mtime):
+            return False
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.copy2(src, dst)
+    return True
+
+
+def open_response_cache(conf, prefix):
+    """`ResponseCache` in folder _cache of `prefix`, `None` if the cache is disabled"""
+    cache_conf = conf.get('cache') or {}
+    if not cache_conf.get('enabled', True):
+        return None
+    return ResponseCache(os.path.join(prefix, '_cache', 'http.db'),
+                         max_bytes=int(cache_conf.get('max_size_mb', 64) * 1024 * 1024), ttls=cache_conf.get('ttl'))
+
+
+def template_environment(prefix):
+    """Environment of the templates in folder "templ", their bytecode is cached across runs"""
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+    bytecode_dir = os.path.join(prefix, '_cache', 'jinja')
+    os.makedirs(bytecode_dir, exist_ok=True)
+    return Environment(loader=FileSystemLoader(os.path.join(prefix, 'templ'), encoding='utf-8'),
+                       bytecode_cache=FileSystemBytecodeCache(bytecode_dir))
+
+
+def get_template(env, name):
+    """Compiled template `name`, an empty template if it does not exist"""
+    from jinja2 import TemplateNotFound
+    try:
+        return env.get_template(name)
+    except TemplateNotFound:
+        return env.from_string('')
+
+
+# templates and settings of the process rendering problems, see `init_render_worker`
+_render_ctx = {}
+
+
+def render_context(prefix, repo, conf, date):
+    """Templates in `prefix` and settings problems are rendered with, into folder `repo`"""
+    env = template_environment(prefix)
+    return {
+        'repo': repo,
+        'conf': conf,
+        'date': date,
+        'question': get_template(env, 'question.md.txt'),
+        'solution': get_template(env, 'solution.txt'),
+    }
+
+
+def init_render_worker(*args):
+    _render_ctx.update(render_context(*args))
+
+
+def render_job(job, ctx=None):
+    """
+    Render and write one problem file, the same in the main process and in the worker processes.
+    `job` is (filename, json of [question, note, solutions, pins], input digest, digest in the manifest).
+    `ctx` is the `render_context`, the one of the worker process by default.
+    Return (filename, digest, whether the file is written).
+    """
+    ctx = ctx or _render_ctx
+    filename, payload, digest, old_digest = job
+    question, note, solutions, pins = json.loads(payload)
+    solution_templ = ctx['solution']
+    answer = note.replace('\n', '\n\n')
+    for solution in solutions:
+        submission_id = solution['submission_id']
+        if submission_id in pins:
+            answer = answer.replace('<!--&%s-->' % submission_id, solution_templ.render(solution=solution))
+        else:
+            answer += '\n\n%s\n' % solution_templ.render(solution=solution)
+    content = ctx['question'].render(question=question, note=note, solutions=solutions, date=ctx['date'],
+                                     conf=ctx['conf'], answer=answer)
+    if sys.platform != 'win32':
+        content = content.replace('\r\n', '\n')
+    digest = digest or hash_of(content)
+    path = os.path.join(ctx['repo'], filename)
+    if digest == old_digest and os.path.isfile(path):
+        return filename, digest, False
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return filename, digest, True
+
+
+class QuestionCatalog:
+    """
+    Questions of the accounts published by one process, they do not depend on the account so they are
+    fetched once and stored in the database at `path`. `lock` guards the questions and the database.
+    """
+
+    def __init__(self, path, http_cache=None, metrics=None):
+        self.dao = Dao(sqlite3.connect(path, check_same_thread=False))
+        self.dao.prepare()
+        self.lock = threading.Lock()
+        self.questions = {}
+        # questionId -> fields it was fetched with, for the questions not fetched with `QUESTION_FIELDS`
+        self.fields = {}
+        self.loaded = False
+        # Chinese version comes with translation
+        self.users = (UserCN(http_cache, metrics), UserEN(http_cache, metrics))
+        # `allQuestions` index, slug -> entry and title -> slug, see `RepoGen.load_index`
+        self.index = {}
+        self.slugs = {}
+        self.index_updated = None
+
+    def set_index(self, entries, updated):
+        self.index = {entry.titleSlug: entry for entry in entries}
+        self.slugs = {entry.title: entry.titleSlug for entry in entries}
+        self.index_updated = updated
+
+    def close(self):
+        self.dao.close()
+
+
 class RepoGen:
+    """
+    Publisher of one account. `prefix` is the folder of its cache and repository, templates and resources
+    are always the ones of LP_PREFIX. `catalog` is the `QuestionCatalog` shared with other accounts.
+    """
 
-    def __init__(self, conf):
+    def __init__(self, conf, prefix=None, catalog=None):
         self.conf = conf
+        self.prefix = prefix or LP_PREFIX
+        # settings, templates, resources and code the run starts with, saved for `fastpath` once published
+        self.inputs = fastpath.inputs_digest(conf, LP_PREFIX)
+        os.makedirs(os.path.join(self.prefix, '_cache'), exist_ok=True)
+        self.metrics = Metrics()
         self.user = None
-        self.all_submissions = []
+        self.reset()
+        self.question_users = None
+        self.dao = self.open_dao()
+        self.dao.prepare()
+        self.http_cache = self.response_cache()
+        self.own_catalog = catalog is None
+        self.catalog = catalog or QuestionCatalog(os.path.join(self.prefix, '_cache', 'leetcode.db'),
+                                                  self.http_cache, self.metrics)
+        self.questions = self.catalog.questions
+
+    def reset(self):
+        """Forget the data of the previous run"""
+        self.cached_submission_ids = set()
         self.new_ac_submissions = defaultdict(list)
         self.new_ac_title_slugs = set()
         self.solutions = defaultdict(list)
-        self.questions = {}
         self.notes = {}
+        self.notes_digest = None
         self.likes = {}
         self.templates = {'solution': ''}
+        self.env = None
         self.summary = None
-        self.dao = Dao(sqlite3.connect(os.path.join(LP_PREFIX, '_cache', 'leetcode.db')))
-        self.dao.prepare()
+        self.manifest = {}
+        self.rendered = set()
+        self.plan = None
+        # whether the run has been deployed, see `after_deploy`
+        self.published = False
+
+    def next_run(self):
+        """Start another run, the login, the connections and the loaded questions are kept"""
+        self.reset()
+        self.metrics = Metrics()
+        self.user.metrics = self.metrics
+        if self.own_catalog:
+            for user in self.catalog.users:
+                user.metrics = self.metrics
+        if self.http_cache:
+            self.http_cache.hits = self.http_cache.revalidated = self.http_cache.misses = 0
 
-    def main(self):
+    def open_dao(self):
+        return Dao(sqlite3.connect(os.path.join(self.prefix, '_cache', 'leetcode.db')))
+
+    def response_cache(self):
+        return open_response_cache(self.conf, self.prefix)
+
+    def main(self, watch=False):
         self.logger()
+        if watch:
+            self.watch()
+        else:
+            self.publish()
+
+    def publish(self):
         console('{0} leetcode publisher start {0}'.format('=' * 20))
         # noinspection PyBroadException
         try:
             if self.login():
                 console('> Login successful!')
-                self.prepare_templates()
-                self.fetch_notes()
-                self.prepare_submissions()
-                self.prepare_solutions()
-                self.prepare_questions()
-                # self.prepare_likes()
-                self.prepare_render()
-                self.render_readme()
-                self.render_problems()
-                self.copy_source()
-                deploy_ret = self.deploy()
-                self.after_deploy(deploy_ret)
+                self.run()
             else:
                 console('> Login failed!')
         except Exception as e:
             logging.exception(e)
+        self.dump_metrics()
+        self.close()
         console('{0} leetcode publisher end {0}'.format('=' * 20))
 
+    def run(self):
+        """Fetch, render and deploy everything new, once logged in"""
+        self.prepare_templates()
+        self.fetch_notes()
+        self.prepare_submissions()
+        if self.pipeline_conf().get('enabled'):
+            self.run_pipeline()
+        else:
+            self.prepare_solutions()
+            self.prepare_questions()
+            if self.plan.likes:
+                self.prepare_likes()
+            self.prepare_render()
+            self.render_readme()
+            self.render_problems()
+        self.copy_source()
+        deploy_ret = self.deploy()
+        self.after_deploy(deploy_ret)
+
+    def watch(self):
+        """
+        Publish, then check the newest submissions every `watch.interval` seconds and publish again
+        once an accepted one shows up, until interrupted. The login and the connections are kept.
+        A run that failed or was not deployed is tried again at the next check.
+        """
+        watch_conf = self.conf.get('watch') or {}
+        interval = max(1.0, float(watch_conf.get('interval', 300)))
+        jitter = min(1.0, max(0.0, float(watch_conf.get('jitter', 0.1))))
+        console('{0} leetcode publisher watch {0}'.format('=' * 20))
+        # noinspection PyBroadException
+        try:
+            if not self.login():
+                console('> Login failed!')
+                return
+            console('> Login successful!')
+            while True:
+                try:
+                    self.run()
+                except Exception as e:
+                    logging.exception(e)
+                self.dump_metrics()
+                known_id = self.dao.max_submission_id()
+                console('> Waiting for new accepted submissions, checked every %ds' % interval)
+                found = False
+                while not found:
+                    # polls of several publishers do not stay in step
+                    time.sleep(interval * random.uniform(1 - jitter, 1 + jitter))
+                    if not self.published:
+                        # its submissions are stored, polls would take them as already published
+                        console('> The last run was not published, try again')
+                        break
+                    try:
+                        found, known_id = self.poll(known_id)
+                    except Exception as e:
+                        logging.exception(e)
+                self.next_run()
+        except KeyboardInterrupt:
+            console('> Stopped')
+        finally:
+            self.close()
+            console('{0} leetcode publisher end {0}'.format('=' * 20))
+
+    def poll(self, known_id):
+        """
+        Whether an accepted submission newer than `known_id` has shown up, checked with one small request.
+        Return it and the id of the newest submission.
+        """
+        j = self.user.submissions_window(0)
+        new_submissions = [sd for sd in j['submissions_dump'] if known_id is None or sd['id'] > known_id]
+        newest_id = max([sd['id'] for sd in new_submissions], default=known_id)
+        if any(sd['status_display'] == 'Accepted' for sd in new_submissions):
+            return True, newest_id
+        # older submissions than the ones returned may be new too
+        more = bool(new_submissions) and len(new_submissions) == len(j['submissions_dump']) and j['has_next']
+        logging.debug('Poll: %d new submissions, none accepted', len(new_submissions))
+        return more, newest_id
+
+    def close(self):
+        self.dao.close()
+        if self.own_catalog:
+            self.catalog.close()
+        if self.http_cache:
+            self.http_cache.close()
+
+    def dump_metrics(self):
+        if self.http_cache:
+            self.metrics.count('http_cache_hits', self.http_cache.hits)
+            self.metrics.count('http_cache_revalidated', self.http_cache.revalidated)
+            self.metrics.count('http_cache_misses', self.http_cache.misses)
+        path = self.metrics.dump(os.path.join(self.prefix, '_cache', 'metrics'))
+        console('> %s' % ', '.join('%s %.2fs' % stage for stage in self.metrics.stages.items()))
+        console('> Metrics written to %s' % os.path.relpath(path, LP_PREFIX))
+
     @staticmethod
     def logger():
         log_file = os.path.join(LP_PREFIX, '_cache', 'log', '%s.log' % datetime.now().strftime('%Y-%m-%d'))
@@ -84,19 +370,31 @@ class RepoGen:
         sh.setLevel(logging.WARNING)
         root.addHandler(sh)
 
+    @timed('login')
     def login(self):
         self.conf['account']['domain'] = self.conf['account'].get('domain', 'en').lower()
         domain = self.conf['account']['domain'].lower()
         if domain == 'cn':
-            self.user = UserCN()
+            self.user = UserCN(self.http_cache, self.metrics)
         elif domain == 'en':
-            self.user = UserEN()
+            self.user = UserEN(self.http_cache, self.metrics)
         else:
             raise ValueError("Unrecognized domain: '{}'".format(domain))
-        return self.user.login(self.conf['account']['user'], self.conf['account']['password'])
+        self.user.set_options(rate=self.fetch_conf().get('rate', 5))
+        store = None
+        if self.conf['account'].get('remember', True):
+            store = SessionStore(os.path.join(self.prefix, '_cache', 'session.json'))
+        return self.user.login(self.conf['account']['user'], self.conf['account']['password'], store)
 
+    @timed('templates')
     def prepare_templates(self):
+        # templates are compiled once per run and their bytecode is reused across runs
+        self.env = template_environment(LP_PREFIX)
         self.get_solution_template()
+        # only what the templates use is downloaded
+        import planner
+        self.plan = planner.plan(self.env)
+        logging.info('Fetch plan: %r', self.plan)
 
     def get_solution_template(self):
         solution_txt = os.path.join(LP_PREFIX, 'templ', 'solution.txt')
@@ -105,34 +403,24 @@ class RepoGen:
                 self.templates['solution'] = fp.read()
 
     def __submissions(self):
-        for subm in self.dao.get_submissions():
-            self.all_submissions.append({
-                'code': subm[0],
-                'compare_result': subm[1],
-                'id': subm[2],
-                'is_pending': subm[3],
-                'lang': subm[4],
-                'memory': subm[5],
-                'runtime': subm[6],
-                'status_display': subm[7],
-                'timestamp': subm[8],
-                'title': subm[9],
-                'url': subm[10]
-            })
-        self.all_submissions.sort(key=lambda sub: sub['timestamp'], reverse=True)
-        all_submission_ids = [submission['id'] for submission in self.all_submissions]
-
         submission_offset = None
-        submission_offset_filename = os.path.join(LP_PREFIX, '_cache', 'submission_offset.txt')
+        submission_offset_filename = os.path.join(self.prefix, '_cache', 'submission_offset.txt')
         if os.path.isfile(submission_offset_filename):
             with open(submission_offset_filename, 'r', encoding='utf8') as f:
                 submission_offset = f.read().strip()
                 if submission_offset:
                     submission_offset = int(submission_offset)
 
+        if self.full_sync():
+            # asked for, every submission is downloaded again, not only the ones newer than the offset
+            yield from self.__sync_submissions(None if self.fetch_conf().get('full_sync') else submission_offset)
+            return
+
         has_next = True
         stop_flag = False
         page = 0
+        # ids inserted by this run, a page may repeat submissions of the previous one if new ones arrive
+        new_submission_ids = set()
 
         while has_next and not stop_flag:
             page += 1
@@ -140,36 +428,96 @@ class RepoGen:
             print('\r> Get submission record of page %d      ' % page, end='', flush=True)
             j = self.user.submissions(page)
             has_next = j['has_next']
-            for sd in j['submissions_dump']:
-                if sd['id'] in all_submission_ids:
-                    cache_pos = all_submission_ids.index(sd['id'])
-                    if cache_pos >= 0:
-                        for idx in range(cache_pos, len(all_submission_ids)):
-                            submission = self.all_submissions[idx]
-                            if submission_offset and submission['id'] <= submission_offset:
-                                break
-                            yield submission
-                        stop_flag = True
-                        break
-                if submission_offset and sd['id'] <= submission_offset:
+            for sd in map(Submission.from_dict, j['submissions_dump']):
+                if sd.id in new_submission_ids:
+                    continue
+                cached = self.dao.get_submission(sd.id)
+                if cached is not None:
+                    # everything older than the first known submission is cached, continue from the cache
+                    for submission in self.dao.iter_submissions(until=cached):
+                        if submission_offset and submission.id <= submission_offset:
+                            break
+                        self.cached_submission_ids.add(submission.id)
+                        yield submission
+                    stop_flag = True
+                    break
+                if submission_offset and sd.id <= submission_offset:
                     stop_flag = True
                     break
                 new_submissions.append(sd)
+                new_submission_ids.add(sd.id)
                 yield sd
-            new_submissions.sort(key=lambda sub: sub['timestamp'], reverse=True)
+            new_submissions.sort(key=lambda sub: sub.timestamp, reverse=True)
             self.dao.insert_submissions(new_submissions)
 
         print('\r', end='', flush=True)
         console('> Get submission record completed!            ')
 
+    def full_sync(self):
+        """Whether to download every submission, on the first run or if asked to"""
+        return self.fetch_conf().get('full_sync') or self.dao.max_submission_id() is None
+
+    def __sync_submissions(self, submission_offset):
+        """
+        Download every submission, several pages at a time. Pages are requested by offset,
+        the results are merged in order and deduplicated, since new submissions shift the offsets.
+        """
+        page_size = max(1, int(self.fetch_conf().get('page_size') or 20))
+        workers = self.fetch_workers()
+        console('> Sync all submissions')
+        j = self.user.submissions_window(0, page_size)
+        if j['has_next'] and 0 < len(j['submissions_dump']) < page_size:
+            # LeetCode has capped the page size
+            page_size = len(j['submissions_dump'])
+        seen_ids = set()
+        page = 1
+        next_offset = page_size
+        pages = deque()
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            while True:
+                print('\r> Get submission record of page %d      ' % page, end='', flush=True)
+                new_submissions = []
+                stop_flag = False
+                for sd in map(Submission.from_dict, j['submissions_dump']):
+                    if sd.id in seen_ids:
+                        continue
+                    if submission_offset and sd.id <= submission_offset:
+                        stop_flag = True
+                        break
+                    if self.dao.get_submission(sd.id) is not None:
+                        self.cached_submission_ids.add(sd.id)
+                    new_submissions.append(sd)
+                    seen_ids.add(sd.id)
+                    yield sd
+                new_submissions.sort(key=lambda sub: sub.timestamp, reverse=True)
+                self.dao.insert_submissions(new_submissions)
+                if stop_flag or not j['has_next'] or not j['submissions_dump']:
+                    break
+                while len(pages) < workers:
+                    pages.append(executor.submit(self.user.submissions_window, next_offset, page_size))
+                    next_offset += page_size
+                j = pages.popleft().result()
+                page += 1
+        finally:
+            for future in pages:
+                future.cancel()
+            executor.shutdown()
+
+        print('\r', end='', flush=True)
+        console('> Get submission record completed!            ')
+
+    @timed('submissions')
     def prepare_submissions(self):
+        # title -> languages of the accepted submissions kept
+        ac_langs = defaultdict(set)
         for sd in self.__submissions():
-            if sd['status_display'] != 'Accepted':
+            if sd.status_display != 'Accepted':
                 continue
-            if sd['title'] in self.new_ac_submissions:
-                if sd['lang'] in [sub['lang'] for sub in self.new_ac_submissions[sd['title']]]:
-                    continue
-            self.new_ac_submissions[sd['title']].append(sd)
+            if sd.lang in ac_langs[sd.title]:
+                continue
+            ac_langs[sd.title].add(sd.lang)
+            self.new_ac_submissions[sd.title].append(sd)
 
     def get_pin_solutions(self):
         pin_solutions = dict()
@@ -177,140 +525,285 @@ class RepoGen:
             pin_solutions[slug] = list(map(int, re.findall(r'<!--&(\d+)-->', note)))
         return pin_solutions
 
+    def fetch_workers(self):
+        return max(1, int(self.fetch_conf().get('workers', 4)))
+
+    def cached_solution(self, title, sub, title_slug_map):
+        """Find the solution of submission `sub` without fetching its detail page"""
+        solu = None
+        timestamp = None
+        if title_slug_map.get(title):
+            if title_slug_map[title] in self.solutions:
+                for solution in self.solutions[title_slug_map[title]]:
+                    if solution.submission_id == sub.id:
+                        solu = solution
+                        break
+
+            if sub.id in self.cached_submission_ids:
+                timestamp = sub.timestamp
+            # unless the templates use what only detail pages have, submissions are used as solutions,
+            # the code of the ones cached before this run is loaded on demand
+            if not self.plan.solution_details:
+                if sub.code is None:
+                    sub.code = self.dao.get_submission_code(sub.id)
+                solu = Solution.from_submission(sub, title_slug_map[title])
+        return solu, timestamp
+
+    @timed('solutions')
     def prepare_solutions(self):
-        self.summary = self.summary or self.user.summary()
-        title_slug_map = dict()
-        for stat in self.summary['stat_status_pairs']:
-            title_slug_map[stat['stat']['question__title']] = stat['stat']['question__title_slug']
+        for _ in self.iter_solutions():
+            pass
 
-        solu_file = os.path.join(LP_PREFIX, '_cache', 'solutions.json')
-        if os.path.exists(solu_file):
-            with open(solu_file, 'r', encoding='utf-8') as f:
-                self.solutions = json.load(f)
-        pin_solutions = self.get_pin_solutions()
+    def iter_solutions(self):
+        """
+        Prepare the solutions of every question, generating (slug, solutions) once their solutions are final.
+        Each slug is generated once, the ones with pinned solutions after the pins are fetched.
+        """
+        self.load_index()
+        title_slug_map = self.catalog.slugs
+        if any(title not in title_slug_map for title in self.new_ac_submissions):
+            # questions newer than the index
+            self.summary = self.summary or self.user.summary()
+            title_slug_map = dict(title_slug_map)
+            for stat in self.summary['stat_status_pairs']:
+                title_slug_map.setdefault(stat['stat']['question__title'], stat['stat']['question__title_slug'])
 
-        submissions = defaultdict(list)
-        for submission in self.all_submissions:
-            if submission['title'] in title_slug_map:
-                submissions[title_slug_map[submission['title']]].append(submission)
+        self.import_solution_file()
+        self.solutions = self.dao.get_solutions()
+        plan_file = os.path.join(self.prefix, '_cache', 'fetch_plan.json')
+        if self.plan.solution_details and not self.last_plan(plan_file).get('solution_details', True):
+            self.fetch_solution_details()
+        pin_solutions = self.get_pin_solutions()
+        generated = set()
 
         console('> Get solutions')
 
-        counter_init, counter = 0, 0
+        # Detail pages are downloaded concurrently, but merged in the original order
+        executor = ThreadPoolExecutor(max_workers=self.fetch_workers())
+        futures = OrderedDict()
         for title, sublist in self.new_ac_submissions.items():
             for sub in sublist[::-1]:
-                solu = None
-                timestamp = None
-                if title_slug_map.get(title):
-                    if title_slug_map[title] in self.solutions:
-                        for solution in self.solutions[title_slug_map[title]]:
-                            if solution['submission_id'] == sub['id']:
-                                solu = solution
-                                solu['id'] = solu['submission_id']
-                                break
-
-                    if sub['title'] in title_slug_map and title_slug_map[sub['title']] in submissions:
-                        for solution in submissions[title_slug_map[title]]:
-                            if solution['id'] == sub['id']:
-                                timestamp = solution['timestamp']
-                                if '.beats' not in self.templates['solution'] and (
-                                        "'beats'" not in self.templates['solution']):
-                                    solu = solution
-                                    solu['submission_id'] = solu['id']
-                                    solu['title_slug'] = title_slug_map[title]
-                                    solu['language'] = solu['lang']
-                                    break
-                if solu is None:
-                    solu = self.user.solution(sub['id'])
-                    solu['id'] = solu['submission_id']
-                    solu['lang'] = solu['language']
-                    counter += 1
-                    solu['timestamp'] = timestamp
-                    console(title)
-
-                slug = solu['title_slug']
-                self.new_ac_title_slugs.add(slug)
-                if slug not in self.solutions:
-                    self.solutions[slug] = [solu]
-                else:
-                    for i in range(len(self.solutions[slug]) - 1, -1, -1):
-                        if self.solutions[slug][i]['language'] == solu['language']:
-                            if solu['submission_id'] not in pin_solutions.get(slug, []):
-                                self.solutions[slug].pop(i)
-                    if solu['id'] not in [subm.get('id', subm.get('submission_id')) for subm in self.solutions[slug]]:
-                        self.solutions[slug].insert(0, solu)
-
-            if counter - counter_init > 50:
-                with open(solu_file, 'w', encoding='utf-8') as f:
-                    json.dump(self.solutions, f)
-                counter_init = counter
-
-        # fetch remain pin solutions
-        for slug, solution_ids in pin_solutions.items():
-            for solution_id in solution_ids:
-                if solution_id not in self.solutions.get(slug, {}):
-                    if solution_id not in [subm.get('id', subm.get('submission_id')) for subm in self.solutions[slug]]:
-                        solution = self.user.solution(solution_id)
-                        console(solution['title'])
-                        self.solutions[slug].append(solution)
-        with open(solu_file, 'w', encoding='utf-8') as f:
-            json.dump(self.solutions, f)
+                if self.cached_solution(title, sub, title_slug_map)[0] is None:
+                    futures[sub.id] = executor.submit(self.user.solution, sub.id)
+
+        try:
+            for title, sublist in self.new_ac_submissions.items():
+                slugs = set()
+                for sub in sublist[::-1]:
+                    solu, timestamp = self.cached_solution(title, sub, title_slug_map)
+                    if solu is None:
+                        solu = Solution.from_dict(futures.pop(sub.id).result())
+                        solu.lang = solu.language
+                        solu.timestamp = timestamp
+                        console(title)
+
+                    slug = solu.title_slug
+                    self.new_ac_title_slugs.add(slug)
+                    slugs.add(slug)
+                    if slug not in self.solutions:
+                        self.solutions[slug] = [solu]
+                    else:
+                        for i in range(len(self.solutions[slug]) - 1, -1, -1):
+                            if self.solutions[slug][i].language == solu.language:
+                                if solu.submission_id not in pin_solutions.get(slug, []):
+                                    self.solutions[slug].pop(i)
+                        if solu.id not in [subm.id for subm in self.solutions[slug]]:
+                            self.solutions[slug].insert(0, solu)
+                    # saved at once, a run that crashes does not have to download it again
+                    self.dao.save_solutions({slug: self.solutions[slug]})
+
+                # pinned solutions are added below
+                for slug in slugs - set(pin_solutions):
+                    generated.add(slug)
+                    yield slug, list(self.solutions[slug])
+
+            # fetch remain pin solutions
+            for slug, solution_ids in pin_solutions.items():
+                for solution_id in solution_ids:
+                    if solution_id not in self.solutions.get(slug, {}):
+                        if solution_id not in [subm.id for subm in self.solutions[slug]]:
+                            futures[(slug, solution_id)] = executor.submit(self.user.solution, solution_id)
+            for slug, solution_id in list(futures):
+                solution = Solution.from_dict(futures.pop((slug, solution_id)).result())
+                console(solution.title)
+                self.solutions[slug].append(solution)
+                self.dao.save_solutions({slug: self.solutions[slug]})
+        finally:
+            for future in futures.values():
+                future.cancel()
+            executor.shutdown()
+        dump_json({'solution_details': self.plan.solution_details}, plan_file)
+        for slug in list(self.solutions):
+            if slug not in generated:
+                yield slug, list(self.solutions[slug])
 
+    @staticmethod
+    def last_plan(plan_file):
+        if not os.path.exists(plan_file):
+            return {}
+        with open(plan_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def fetch_solution_details(self):
+        """Fetch the detail pages of the solutions made from submissions, since the templates now use them"""
+        console('> Get solution details')
+        with ThreadPoolExecutor(max_workers=self.fetch_workers()) as executor:
+            futures = OrderedDict(((slug, i), executor.submit(self.user.solution, solution.submission_id))
+                                  for slug, solutions in self.solutions.items()
+                                  for i, solution in enumerate(solutions) if solution.beats is None)
+            for (slug, i), future in futures.items():
+                solution = Solution.from_dict(future.result())
+                solution.lang = solution.language
+                solution.timestamp = self.solutions[slug][i].timestamp
+                self.solutions[slug][i] = solution
+                self.dao.save_solutions({slug: self.solutions[slug]})
+
+    def import_solution_file(self):
+        """Move the solutions cached by older versions in _cache/solutions.json to the database"""
+        solu_file = os.path.join(self.prefix, '_cache', 'solutions.json')
+        if os.path.exists(solu_file):
+            with open(solu_file, 'r', encoding='utf-8') as f:
+                self.dao.save_solutions({slug: list(map(Solution.from_dict, solutions))
+                                         for slug, solutions in json.load(f).items()})
+            os.replace(solu_file, solu_file + '.bak')
+
+    @timed('questions')
     def prepare_questions(self):
-        for que in self.dao.get_questions():
-            self.questions[que[10]] = {
-                'content': que[0],
-                'difficulty': que[1],
-                'dislikes': que[2],
-                'likes': que[3],
-                'questionFrontendId': que[4],
-                'questionId': que[5],
-                'similarQuestions': que[6],
-                'stats': que[7],
-                'status': que[8],
-                'title': que[9],
-                'titleSlug': que[10],
-                'topicTags': eval(que[11]),
-                'translatedContent': que[12],
-                'translatedTitle': que[13],
-            }
-        cn_user = UserCN()  # Chinese version comes with translation
-        en_user = UserEN()
-        console('> Fix questionFrontendId')
-        for slug, question in self.questions.items():
+        self.load_questions()
+        console('> Get questions')
+        missing_slugs = [slug for slug in self.solutions if not self.has_question(slug)]
+        for i in range(0, len(missing_slugs), 100):
+            self.fetch_questions(missing_slugs[i:i + 100])
+
+    def load_questions(self):
+        """Load the cached questions and fix their frontend ids, once for every account sharing the catalog"""
+        self.question_users = self.catalog.users
+        self.load_index()
+        with self.catalog.lock:
+            if not self.catalog.loaded:
+                for question in self.catalog.dao.get_questions():
+                    self.questions[question.titleSlug] = question
+                self.catalog.fields = self.catalog.dao.get_question_fields()
+                self.fix_frontend_ids()
+                self.catalog.loaded = True
+
+    def load_index(self):
+        """
+        Load the index of all questions, downloaded with one `allQuestions` request once it is older than
+        `fetch.index_ttl` seconds. Slugs of titles and frontend ids are looked up in it instead of fetched.
+        """
+        catalog = self.catalog
+        ttl = self.fetch_conf().get('index_ttl', 24 * 3600)
+        with catalog.lock:
+            if catalog.index_updated is None:
+                catalog.set_index(*catalog.dao.get_question_index())
+            if catalog.index_updated is not None and time.time() - catalog.index_updated < ttl:
+                return
+            console('> Get question index')
+            updated = time.time()
+            # noinspection PyBroadException
             try:
-                front_id = int(question['questionFrontendId'])
-            except ValueError:
-                pass
-            else:
-                if front_id > 5000:
-                    console(slug)
-                    self.questions[slug]['questionFrontendId'] = en_user.question(slug)['questionFrontendId']
+                entries = list(map(CatalogEntry.from_dict, catalog.users[1].all_questions()))
+            except Exception as e:
+                # the stored index, if any, and the summary do until the next run
+                logging.exception(e)
+                return
+            catalog.dao.save_question_index(entries, updated)
+            catalog.set_index(entries, updated)
 
-        console('> Get questions')
-        question_buffer = []
-        for slug in self.solutions:
-            if slug not in self.questions:
+    def fix_frontend_id(self, question):
+        """
+        Replace a frontend id of LeetCode China by the one of the index,
+        return whether it has to be fetched since the index does not know the question.
+        """
+        try:
+            front_id = int(question.questionFrontendId)
+        except ValueError:
+            return False
+        if front_id <= 5000:
+            return False
+        entry = self.catalog.index.get(question.titleSlug)
+        if entry is None:
+            return True
+        question.questionFrontendId = entry.questionFrontendId
+        return False
+
+    def fix_frontend_ids(self):
+        """Fix the frontend ids of the loaded questions and store them, so that they are fixed once"""
+        batch_size = self.fetch_conf().get('batch_size', 20)
+        console('> Fix questionFrontendId')
+        front_ids = {slug: question.questionFrontendId for slug, question in self.questions.items() if question}
+        fix_slugs = []
+        for slug, question in self.questions.items():
+            if question and self.fix_frontend_id(question):
                 console(slug)
-                # if there is no the question in LeetCode China, try to search it in LeetCode main site instead
-                question_buffer.append(cn_user.question(slug) or en_user.question(slug))
-                self.questions[slug] = question_buffer[-1]
+                fix_slugs.append(slug)
+        en_user = self.question_users[1]
+        for slug, question in en_user.questions(fix_slugs, batch_size, ('questionFrontendId',), cache=None).items():
+            if question:
+                self.questions[slug].questionFrontendId = question['questionFrontendId']
+        self.catalog.dao.update_frontend_ids([question for slug, question in self.questions.items()
+                                              if question and question.questionFrontendId != front_ids[slug]])
 
-                if len(question_buffer) == 100:
-                    self.dao.insert_questions(question_buffer)
-                    question_buffer = []
-        self.dao.insert_questions(question_buffer)
+    def extra_question_fields(self):
+        """Fields of `fetch.question_fields`, not in `QUESTION_FIELDS`"""
+        return tuple(field for field in self.fetch_conf().get('question_fields') or () if field not in QUESTION_FIELDS)
 
+    def has_question(self, slug):
+        """Whether the question of `slug` is loaded with every field the templates and `fetch.question_fields` use"""
+        if slug not in self.questions:
+            return False
+        question = self.questions[slug]
+        if not question:
+            return True
+        fields = self.catalog.fields.get(question.questionId) or set(QUESTION_FIELDS)
+        return fields.issuperset(self.plan.question_fields + self.extra_question_fields())
+
+    def fetch_questions(self, slugs):
+        """Fetch the questions of `slugs` and save them in the catalog, unless another account already has"""
+        cn_user, en_user = self.question_users
+        batch_size = self.fetch_conf().get('batch_size', 20)
+        with self.catalog.lock:
+            slugs = [slug for slug in slugs if not self.has_question(slug)]
+            if not slugs:
+                return
+            # the fields the templates use, and the ones the questions were fetched with if they are fetched again
+            stored = set().union(*(self.catalog.fields.get(self.questions[slug].questionId, ())
+                                   for slug in slugs if self.questions.get(slug)))
+            fields = tuple(field for field in QUESTION_FIELDS
+                           if field in stored or field in self.plan.question_fields) + self.extra_question_fields()
+            stored_fields = None if fields == QUESTION_FIELDS else fields
+            for slug in slugs:
+                console(slug)
+            questions = cn_user.questions(slugs, batch_size, fields)
+            # if there is no the question in LeetCode China, try to search it in LeetCode main site instead
+            questions.update(en_user.questions([slug for slug in slugs if not questions[slug]], batch_size, fields))
+            fetched = []
+            for slug in slugs:
+                self.questions[slug] = questions[slug] and Question.from_dict(questions[slug])
+                if self.questions[slug]:
+                    self.fix_frontend_id(self.questions[slug])
+                    fetched.append(self.questions[slug])
+                    if stored_fields is None:
+                        self.catalog.fields.pop(self.questions[slug].questionId, None)
+                    else:
+                        self.catalog.fields[self.questions[slug].questionId] = set(stored_fields)
+            self.catalog.dao.insert_questions(fetched, stored_fields)
+
+    @timed('notes')
     def fetch_notes(self):
+        if not self.plan.notes:
+            return
         console('> Get notes')
         notes = self.user.notes()
+        self.notes_digest = fastpath.digest(notes)
         self.notes = {
             obj['question']['titleSlug']: obj['content'] for obj in notes
         }
 
     def prepare_notes(self):
         """Deprecated. Because of `fetch_notes`"""
-        note_file = os.path.join(LP_PREFIX, '_cache', 'notes.json')
+        note_file = os.path.join(self.prefix, '_cache', 'notes.json')
         if os.path.exists(note_file):
             with open(note_file, 'r', encoding='utf-8') as f:
                 self.notes = json.load(f)
@@ -318,12 +811,12 @@ class RepoGen:
         for slug in self.solutions:
             if slug not in self.notes or slug in self.new_ac_title_slugs:
                 console(slug)
-                self.notes[slug] = self.user.note(self.questions[slug]['questionId'])
-        with open(note_file, 'w', encoding='utf-8') as f:
-            json.dump(self.notes, f)
+                self.notes[slug] = self.user.note(self.questions[slug].questionId)
+        dump_json(self.notes, note_file)
 
+    @timed('likes')
     def prepare_likes(self):
-        like_file = os.path.join(LP_PREFIX, '_cache', 'likes.json')
+        like_file = os.path.join(self.prefix, '_cache', 'likes.json')
         if os.path.exists(like_file):
             with open(like_file, 'r', encoding='utf-8') as f:
                 self.likes = json.load(f)
@@ -332,106 +825,350 @@ class RepoGen:
             if slug not in self.likes or slug in self.new_ac_title_slugs:
                 console(slug)
                 self.likes[slug] = self.user.likes(slug)
-        with open(like_file, 'w', encoding='utf-8') as f:
-            json.dump(self.likes, f)
+        dump_json(self.likes, like_file)
 
-    @staticmethod
-    def prepare_render():
-        # delete folder "repo"
-        shutil.rmtree(os.path.join(LP_PREFIX, 'repo'), ignore_errors=True)
-        os.makedirs(os.path.join(LP_PREFIX, 'repo'))
-        os.makedirs(os.path.join(LP_PREFIX, 'repo', 'problems'))
+    def prepare_render(self):
+        self.manifest = {}
+        self.rendered = set()
+        if self.render_conf().get('incremental', True):
+            # keep folder "repo", only changed files will be rewritten
+            manifest_file = os.path.join(self.prefix, '_cache', 'render_manifest.json')
+            if os.path.exists(manifest_file):
+                with open(manifest_file, 'r', encoding='utf-8') as f:
+                    self.manifest = json.load(f)
+        else:
+            # empty folder "repo" but keep its git history
+            for path in glob.glob(os.path.join(self.prefix, 'repo', '*')):
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+        os.makedirs(os.path.join(self.prefix, 'repo', 'problems'), exist_ok=True)
 
+    def write_output(self, filename, content, digest=None):
+        """
+        Write `content` to `filename` under folder "repo" unless it is up to date.
+        `digest` is the hash of everything `content` is rendered from, `None` means compare the content itself.
+        """
+        self.rendered.add(filename)
+        path = os.path.join(self.prefix, 'repo', filename)
+        digest = digest or hash_of(content)
+        if self.manifest.get(filename) == digest and os.path.isfile(path):
+            return False
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        self.manifest[filename] = digest
+        return True
+
+    @timed('readme')
     def render_readme(self):
-        self.summary = self.summary or self.user.summary()
+        if self.plan.summary:
+            self.summary = self.summary or self.user.summary()
         console('> Render README.md')
         # This determines how to sort the problems
+        # the catalog may hold the questions of other accounts too
         ques_sort = sorted(
-            [(ques['questionFrontendId'], ques['titleSlug']) for ques in self.questions.values()],
+            [(self.questions[slug].questionFrontendId, slug) for slug in self.solutions if self.questions.get(slug)],
             key=lambda x: -int(x[0]))
         # You can customize the template
-        tmpl = Template(open(os.path.join(LP_PREFIX, 'templ', 'README.md.txt'), encoding='utf-8').read())
+        tmpl = get_template(self.env, 'README.md.txt')
         readme = tmpl.render(questions=[self.questions[slug] for _, slug in ques_sort], likes=self.likes,
                              date=datetime.now(), summary=self.summary, conf=self.conf)
-        with open(os.path.join(LP_PREFIX, 'repo', 'README.md'), 'w', encoding='utf-8') as f:
-            f.write(readme)
+        self.count_file(self.write_output('README.md', readme))
+
+    def render_args(self):
+        """Arguments of `render_context`, templates are shared by every account"""
+        return LP_PREFIX, os.path.join(self.prefix, 'repo'), self.conf, datetime.now()
+
+    def render_jobs(self):
+        return max(1, int(self.render_conf().get('jobs') or 1))
+
+    def template_digest(self):
+        """Hash of the templates and settings problems are rendered with, `None` if they must always be rendered"""
+        from jinja2 import meta
+        # You can customize the template
+        tmpl_source = self.env.loader.get_source(self.env, 'question.md.txt')[0]
+        # the output depends on the time if the template uses `date`, so it is always rendered
+        if 'date' in meta.find_undeclared_variables(self.env.parse(tmpl_source)):
+            return None
+        return hash_of([tmpl_source, self.templates['solution'], self.conf, sys.platform == 'win32'])
+
+    def problem_job(self, slug, solutions, tmpl_digest, pins):
+        """Filename of the problem of `slug` and the job rendering it, `None` if the file is up to date"""
+        question = self.questions[slug]
+        note = self.notes.get(slug, "")
+        filename = os.path.join('problems', '%s-%s.md' % (question.questionFrontendId, slug))
+        digest = tmpl_digest and hash_of([tmpl_digest, question, note, solutions])
+        if digest and self.manifest.get(filename) == digest and os.path.isfile(
+                os.path.join(self.prefix, 'repo', filename)):
+            return filename, None
+        payload = json.dumps([question, note, solutions, pins], default=to_json)
+        return filename, (filename, payload, digest, self.manifest.get(filename))
 
+    @timed('problems')
     def render_problems(self):
         console('> Render problems')
-        # You can customize the template
-        tmpl = Template(
-            open(os.path.join(LP_PREFIX, 'templ', 'question.md.txt'), encoding='utf-8').read())
         pin_solutions = self.get_pin_solutions()
-        # template for single solution
-        solution_templ = Template(self.templates['solution'])
+        tmpl_digest = self.template_digest()
+        jobs = []
+        solution_cnt = 0
         for slug in self.solutions:
-            question = self.questions[slug]
-            note = self.notes.get(slug, "")
-            answer = note.replace('\n', '\n\n')
-            solutions = self.solutions[slug]
-            pins = pin_solutions.get(slug, [])
-            for solution in solutions:
-                submission_id = solution['submission_id']
-                if submission_id in pins:
-                    answer = answer.replace('<!--&%s-->' % submission_id, solution_templ.render(solution=solution))
-                else:
-                    answer += '\n\n%s\n' % solution_templ.render(solution=solution)
-            content = tmpl.render(question=question, note=note, solutions=solutions,
-                                  date=datetime.now(), conf=self.conf, answer=answer)
-            if sys.platform != 'win32':
-                content = content.replace('\r\n', '\n')
-            filename = '%s-%s.md' % (question['questionFrontendId'], slug)
-            with open(os.path.join(LP_PREFIX, 'repo', 'problems', filename), 'w', encoding='utf-8') as f:
-                f.write(content)
+            filename, job = self.problem_job(slug, self.solutions[slug], tmpl_digest, pin_solutions.get(slug, []))
+            self.rendered.add(filename)
+            if job is not None:
+                solution_cnt += len(self.solutions[slug])
+                jobs.append(job)
 
-    @staticmethod
-    def copy_source():
+        start = time.time()
+        init_args = self.render_args()
+        workers = min(self.render_jobs(), len(jobs))
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_render_worker,
+                                     initargs=init_args) as executor:
+                results = list(executor.map(render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+        else:
+            ctx = render_context(*init_args)
+            results = [render_job(job, ctx) for job in jobs]
+        written = 0
+        for filename, digest, is_written in results:
+            self.manifest[filename] = digest
+            written += is_written
+        elapsed = time.time() - start
+
+        self.remove_stale_outputs()
+        self.render_report(len(jobs), solution_cnt, elapsed, max(workers, 1), written)
+
+    def count_file(self, written):
+        self.metrics.count('files_written' if written else 'files_skipped')
+
+    def render_report(self, rendered, solution_cnt, elapsed, workers, written):
+        self.metrics.count('files_written', written)
+        self.metrics.count('files_skipped', len(self.solutions) - written)
+        console('> %d problems (%d solutions) rendered in %.2fs with %d process(es), %.1f problems/s, '
+                '%d written, %d up to date' % (rendered, solution_cnt, elapsed, workers,
+                                               rendered / elapsed if elapsed else 0, written,
+                                               len(self.solutions) - rendered))
+
+    # sections of the settings, a section whose keys are all commented out is `None` in yaml
+    def fetch_conf(self):
+        return self.conf.get('fetch') or {}
+
+    def render_conf(self):
+        return self.conf.get('render') or {}
+
+    def deploy_conf(self):
+        return self.conf.get('deploy') or {}
+
+    def pipeline_conf(self):
+        return self.conf.get('pipeline') or {}
+
+    @timed('pipeline')
+    def run_pipeline(self):
+        """
+        Fetch solutions, fetch questions and render problems at the same time, connected by bounded queues.
+        A problem is rendered as soon as its solutions and its question are ready.
+        """
+        self.load_questions()
+        self.prepare_render()
+        console('> Get solutions and questions, render problems')
+        init_args = self.render_args()
+        workers = self.render_jobs()
+        executor = ctx = None
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=init_render_worker, initargs=init_args)
+        else:
+            ctx = render_context(*init_args)
+        pipeline = Pipeline(self.pipeline_conf().get('queue_size', 64))
+        pipeline.add('questions', self.question_stage)
+        pipeline.add('render', partial(self.render_stage, executor, ctx))
+        start = time.time()
+        try:
+            results = pipeline.run(self.iter_solutions())
+            rendered = OrderedDict()
+            for filename, result, solution_cnt in results:
+                self.rendered.add(filename)
+                if result is not None:
+                    rendered[filename] = (result.result() if executor else result), solution_cnt
+        finally:
+            if executor:
+                executor.shutdown()
+        written = 0
+        for filename, ((_, digest, is_written), _) in rendered.items():
+            self.manifest[filename] = digest
+            written += is_written
+        elapsed = time.time() - start
+
+        if self.plan.likes:
+            self.prepare_likes()
+        self.render_readme()
+        self.remove_stale_outputs()
+        self.render_report(len(rendered), sum(cnt for _, cnt in rendered.values()), elapsed, workers, written)
+
+    def question_stage(self, inbox):
+        """Make sure the question of each (slug, solutions) is loaded, missing ones are fetched in batches"""
+        for batch in inbox.batches(self.fetch_conf().get('batch_size', 20)):
+            missing_slugs = [slug for slug, _ in batch if not self.has_question(slug)]
+            if missing_slugs:
+                self.fetch_questions(missing_slugs)
+            yield from batch
+
+    def render_stage(self, executor, ctx, inbox):
+        """
+        Render each (slug, solutions), in `executor` if there is one or with `ctx` otherwise,
+        generate (filename, result, solutions)
+        """
+        pin_solutions = self.get_pin_solutions()
+        tmpl_digest = self.template_digest()
+        for slug, solutions in inbox:
+            filename, job = self.problem_job(slug, solutions, tmpl_digest, pin_solutions.get(slug, []))
+            if job is None:
+                yield filename, None, 0
+            elif executor:
+                yield filename, executor.submit(render_job, job), len(solutions)
+            else:
+                yield filename, render_job(job, ctx), len(solutions)
+
+    def remove_stale_outputs(self):
+        """Delete problems no longer generated, e.g. after the frontend id of a question has changed"""
+        problems = os.path.join(self.prefix, 'repo', 'problems')
+        for name in os.listdir(problems):
+            filename = os.path.join('problems', name)
+            if filename not in self.rendered:
+                console('Remove %s' % filename)
+                os.remove(os.path.join(problems, name))
+        self.manifest = {filename: digest for filename, digest in self.manifest.items() if filename in self.rendered}
+        dump_json(self.manifest, os.path.join(self.prefix, '_cache', 'render_manifest.json'))
+
+    @timed('copy_source')
+    def copy_source(self):
         console('> Copy resources')
-        repo = os.path.join(LP_PREFIX, 'repo')
-        for src in glob.glob(os.path.join(LP_PREFIX, '_source', '*')):
+        source = os.path.join(LP_PREFIX, '_source')
+        repo = os.path.join(self.prefix, 'repo')
+        for src in glob.glob(os.path.join(source, '*')):
             console(os.path.relpath(src, LP_PREFIX))
-            dst = os.path.join(repo, os.path.basename(src))
             if os.path.isdir(src):
-                if not os.path.isdir(dst):
-                    shutil.copytree(src, dst)
-                else:
-                    console("Directory '%s' already exist." % os.path.relpath(dst, LP_PREFIX))
+                for root, _, files in os.walk(src):
+                    for name in files:
+                        path = os.path.join(root, name)
+                        self.count_file(copy_if_changed(path, os.path.join(repo, os.path.relpath(path, source))))
             else:
-                shutil.copy(src, repo)
+                self.count_file(copy_if_changed(src, os.path.join(repo, os.path.basename(src))))
 
+    @timed('deploy')
     def deploy(self):
         if self.conf.get('repo'):
             console('> Deploy to git repository')
-            repo = os.path.join(LP_PREFIX, 'repo')
-            cmds = []
-            os.chdir(repo)
-            shutil.rmtree(os.path.join(repo, '.git'), ignore_errors=True)
-            cmds.append('git init')
-            cmds.append('git add .')
-            cmds.append('git commit -m "Auto Deployment"')
-            for remote in self.conf['repo']:
-                cmds.append('git push -f -q %s master:master' % remote)
-
-            for cmd in cmds:
-                console(cmd)
-                try:
-                    subprocess.check_output(cmd, shell=True, stderr=subprocess.STDOUT).decode('utf-8').strip()
-                except subprocess.CalledProcessError:
-                    console("Get error when run '%s'" % cmd)
-                    return False
+            deploy_conf = self.deploy_conf()
+            deployer = GitDeployer(os.path.join(self.prefix, 'repo'), self.conf['repo'],
+                                   branch=deploy_conf.get('branch', 'master'), force=deploy_conf.get('force', False),
+                                   log=console)
+            return deployer.deploy()
         return True
 
     def after_deploy(self, deploy_ret):
+        # cookies may have been renewed during the run
+        self.user.save_session()
+        self.published = bool(deploy_ret)
         if deploy_ret:
-            submission_offset_filename = os.path.join(LP_PREFIX, '_cache', 'submission_offset.txt')
-            with open(submission_offset_filename, 'w', encoding='utf8') as f:
-                f.write('%s\n' % max([submission['id'] for submission in self.all_submissions]))
-        self.dao.close()
+            submission_offset = self.dao.max_submission_id()
+            if submission_offset is not None:
+                submission_offset_filename = os.path.join(self.prefix, '_cache', 'submission_offset.txt')
+                write_atomic(submission_offset_filename, '%s\n' % submission_offset)
+            dump_json({'inputs': self.inputs, 'notes': self.notes_digest},
+                      os.path.join(self.prefix, '_cache', fastpath.MARKER))
+        if self.http_cache:
+            console('> HTTP cache: %d hits, %d revalidated, %d downloaded' % (
+                self.http_cache.hits, self.http_cache.revalidated, self.http_cache.misses))
+
+
+def check_account(account, index):
+    """Raise a ValueError if entry `index` of `accounts` does not have an account and a repository of its own"""
+    account = account or {}
+    missing = [key for key in ('account', 'repo') if key not in account]
+    if missing:
+        raise ValueError('Entry %s of accounts does not set %s' % (
+            account.get('name') or index + 1, ' and '.join('`%s`' % key for key in missing)))
+
+
+def account_conf(conf, account):
+    """
+    Settings of an entry of `accounts`, the keys it leaves out are the ones of `conf`
+    except `account` and `repo`, it publishes its own user to its own repository
+    """
+    merged = {key: value for key, value in conf.items()
+              if key not in ('accounts', 'account_workers', 'account', 'repo')}
+    merged.update((key, value) for key, value in account.items() if key != 'name')
+    return merged
+
+
+def account_name(account):
+    return str(account.get('name') or account['account']['user'])
+
+
+def publish_account(conf, account, catalog):
+    """Publish an entry of `accounts` in folder accounts/<name>, return its `RepoGen`"""
+    # created in the thread it runs in, sqlite connections cannot be shared between threads
+    rg = RepoGen(account_conf(conf, account), os.path.join(LP_PREFIX, 'accounts', account_name(account)), catalog)
+    rg.publish()
+    return rg
+
+
+def publish_accounts(conf, metrics):
+    """
+    Publish every entry of `conf['accounts']`, `account_workers` of them at a time.
+    Their questions are fetched once for all of them and stored in _cache/questions.db, only their submissions,
+    solutions and notes are kept in folder accounts/<name> of each one. Return the `RepoGen` of every account.
+    """
+    accounts = conf['accounts']
+    for index, account in enumerate(accounts):
+        check_account(account, index)
+    names = [account_name(account) for account in accounts]
+    if len(set(names)) < len(names):
+        raise ValueError('Names of accounts are not unique: %s' % ', '.join(names))
+    RepoGen.logger()
+    cache_dir = os.path.join(LP_PREFIX, '_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    http_cache = open_response_cache(conf, LP_PREFIX)
+    catalog = QuestionCatalog(os.path.join(cache_dir, 'questions.db'), http_cache, metrics)
+    workers = max(1, min(int(conf.get('account_workers') or 4), len(accounts)))
+    console('> Publish %d accounts, %d at a time' % (len(accounts), workers))
+    results = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(publish_account, conf, account, catalog) for account in accounts]
+            for name, future in zip(names, futures):
+                rg = future.result()
+                console('> %s: %.2fs, %d problems' % (name, rg.metrics.report()['seconds'], len(rg.solutions)))
+                results.append(rg)
+    finally:
+        catalog.close()
+        if http_cache:
+            metrics.count('http_cache_hits', http_cache.hits)
+            metrics.count('http_cache_revalidated', http_cache.revalidated)
+            metrics.count('http_cache_misses', http_cache.misses)
+            http_cache.close()
+        path = metrics.dump(os.path.join(cache_dir, 'metrics'))
+        console('> Question metrics written to %s' % os.path.relpath(path, LP_PREFIX))
+    return results
 
 
 def _main():
+    parser = argparse.ArgumentParser(description='Generate and publish your LeetCode solution repository.')
+    parser.add_argument('-j', '--jobs', type=int, help='number of processes rendering problems')
+    parser.add_argument('--profile', action='store_true',
+                        help='profile the main thread with cProfile, the stats are saved in _cache/metrics')
+    parser.add_argument('--full-sync', action='store_true', help='download every submission again')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='fetch solutions, fetch questions and render problems at the same time')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and publish again whenever a new accepted submission shows up')
+    args = parser.parse_args()
+
     conf_file = os.path.join(LP_PREFIX, 'config.yml')
     if os.path.isfile(conf_file):
+        import yaml
         for ec in ('utf-8', 'gb18030', 'gb2312', 'gbk'):
             try:
                 with open(conf_file, encoding=ec) as fp:
@@ -446,8 +1183,33 @@ def _main():
                 continue
             except yaml.YAMLError:
                 print('File does not conform to the YAML format specification：%s' % conf_file)
-        rg = RepoGen(conf)
-        rg.main()
+        if args.jobs:
+            conf['render'] = dict(conf.get('render') or {}, jobs=args.jobs)
+        if args.full_sync:
+            conf['fetch'] = dict(conf.get('fetch') or {}, full_sync=True)
+        if args.pipeline:
+            conf['pipeline'] = dict(conf.get('pipeline') or {}, enabled=True)
+        if not (conf.get('accounts') or args.watch or args.full_sync or args.profile) and \
+                fastpath.unchanged(conf, LP_PREFIX):
+            print('Nothing new since the last run, nothing to publish')
+            return
+        if conf.get('accounts'):
+            if args.watch:
+                print('--watch only publishes the account of `account`, not the ones of `accounts`')
+                return
+            metrics = Metrics()
+            run = partial(publish_accounts, conf, metrics)
+        else:
+            rg = RepoGen(conf)
+            metrics, run = rg.metrics, partial(rg.main, args.watch)
+        if args.profile:
+            profiler = cProfile.Profile()
+            profiler.runcall(run)
+            prof_file = metrics.filename(os.path.join(LP_PREFIX, '_cache', 'metrics'), '.prof')
+            profiler.dump_stats(prof_file)
+            print('Profile written to %s, read it with `python -m pstats %s`' % (prof_file, prof_file))
+        else:
+            run()
     else:
         print('File does not exist: %s' % conf_file)
 
@@ -1,9 +1,41 @@
+import ast
+import json
+from collections import defaultdict
+
+from records import CatalogEntry, Question, Solution, Submission
+
+SUBMISSION_COLUMNS = Submission.__slots__
+QUESTION_COLUMNS = Question.__slots__
+# Keys a solution may have, besides `submission_id`, `title_slug` and its position in the list of its question
+SOLUTION_COLUMNS = Solution.__slots__[2:]
+CATALOG_COLUMNS = CatalogEntry.__slots__
+# writes between two checkpoints of the write-ahead log into the database file
+CHECKPOINT_WRITES = 500
+
+
 class Dao:
     def __init__(self, conn):
         self.conn = conn
         self.cur = conn.cursor()
+        self.writes = 0
 
     def prepare(self):
+        self.cur.execute('PRAGMA journal_mode=WAL')
+        self.cur.execute('PRAGMA synchronous=NORMAL')
+        version = self.cur.execute('PRAGMA user_version').fetchone()[0]
+        migrations = self.migrations()
+        for version, migration in enumerate(migrations[version:], version + 1):
+            with self.conn:
+                migration()
+                # PRAGMA does not accept parameters
+                self.cur.execute('PRAGMA user_version = %d' % version)
+
+    def migrations(self):
+        """Schema changes in order, `PRAGMA user_version` is the number of the ones applied"""
+        return [self.migrate_tables, self.migrate_solution_tag_indexes, self.migrate_submission_timestamp_index,
+                self.migrate_question_index, self.migrate_question_fields, self.migrate_question_extra]
+
+    def migrate_tables(self):
         self.cur.execute('''
 CREATE TABLE IF NOT EXISTS submission (
     code TEXT,
@@ -36,57 +68,218 @@ CREATE TABLE IF NOT EXISTS question (
     translatedTitle TEXT
 )''')
 
+    def migrate_solution_tag_indexes(self):
+        # runtime and beats have no type affinity, the values keep the type they are inserted with
+        self.cur.execute('''
+CREATE TABLE IF NOT EXISTS solution (
+    submission_id INTEGER PRIMARY KEY,
+    title_slug TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT,
+    language TEXT,
+    lang TEXT,
+    runtime,
+    memory TEXT,
+    beats,
+    code TEXT,
+    timestamp INTEGER,
+    status_display TEXT,
+    compare_result TEXT,
+    is_pending TEXT,
+    url TEXT
+)''')
+        self.cur.execute('''
+CREATE TABLE IF NOT EXISTS question_tag (
+    questionId TEXT NOT NULL,
+    name TEXT NOT NULL,
+    slug TEXT,
+    translatedName TEXT,
+    PRIMARY KEY (questionId, name)
+)''')
+        self.cur.execute('CREATE INDEX IF NOT EXISTS solution_title_slug ON solution (title_slug, position)')
+        self.cur.execute('CREATE INDEX IF NOT EXISTS submission_title_timestamp ON submission (title, timestamp)')
+        self.cur.execute('CREATE INDEX IF NOT EXISTS submission_status_display ON submission (status_display)')
+        self.cur.execute('CREATE INDEX IF NOT EXISTS question_title_slug ON question (titleSlug)')
+        # move the stringified tag lists of question.topicTags to question_tag, the column is no longer used
+        rows = self.cur.execute('SELECT questionId, topicTags FROM question WHERE topicTags IS NOT NULL').fetchall()
+        for question_id, topic_tags in rows:
+            self.cur.executemany('INSERT OR IGNORE INTO question_tag (questionId, name) VALUES (?, ?)',
+                                 [(question_id, name) for name in ast.literal_eval(topic_tags)])
+        self.cur.execute('UPDATE question SET topicTags = NULL')
+
+    def migrate_submission_timestamp_index(self):
+        self.cur.execute('CREATE INDEX IF NOT EXISTS submission_timestamp ON submission (timestamp, id)')
+
+    def migrate_question_index(self):
+        # `updated` is the time the whole index was downloaded, it is replaced at once
+        self.cur.execute('''
+CREATE TABLE IF NOT EXISTS question_index (
+    titleSlug TEXT PRIMARY KEY,
+    title TEXT,
+    questionFrontendId TEXT,
+    difficulty TEXT,
+    isPaidOnly INTEGER,
+    updated REAL NOT NULL
+)''')
+
+    def migrate_question_fields(self):
+        # fields of `leetcode.QUESTION_FIELDS` a question was fetched with, all of them if it is not here
+        self.cur.execute('''
+CREATE TABLE IF NOT EXISTS question_fields (
+    questionId TEXT PRIMARY KEY,
+    fields TEXT NOT NULL
+)''')
+
+    def migrate_question_extra(self):
+        # json of the fields of `fetch.question_fields`, they are listed in question_fields
+        self.cur.execute('ALTER TABLE question ADD COLUMN extra TEXT')
+
+    def checkpoint(self, mode='PASSIVE'):
+        """Move the write-ahead log into the database file, TRUNCATE also empties the log file"""
+        self.cur.execute('PRAGMA wal_checkpoint(%s)' % mode)
+
     def close(self):
+        self.checkpoint('TRUNCATE')
         self.cur.close()
         self.conn.close()
 
     def insert_submissions(self, submissions):
         data = []
         for submission in submissions:
-            data.append((
-                submission['code'],
-                submission['compare_result'],
-                submission['id'],
-                submission['is_pending'],
-                submission['lang'],
-                submission['memory'],
-                submission['runtime'],
-                submission['status_display'],
-                submission['timestamp'],
-                submission['title'],
-                submission['url']
-            ))
+            data.append(tuple(getattr(submission, column) for column in SUBMISSION_COLUMNS))
         self.cur.executemany('''
-INSERT INTO submission VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', data)
+INSERT INTO submission VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET %s''' % ', '.join('%s = excluded.%s' % (c, c) for c in SUBMISSION_COLUMNS), data)
         self.conn.commit()
 
-    def insert_questions(self, questions):
+    def insert_questions(self, questions, fields=None):
+        """Save `questions` fetched with `fields`, `None` means `leetcode.QUESTION_FIELDS`"""
         data = []
+        tags = []
         for question in questions:
-            data.append((
-                question['content'],
-                question['difficulty'],
-                question['dislikes'],
-                question['likes'],
-                question['questionFrontendId'],
-                question['questionId'],
-                question['similarQuestions'],
-                question['stats'],
-                question['status'],
-                question['title'],
-                question['titleSlug'],
-                str([tag['name'] for tag in question['topicTags']]),
-                question['translatedContent'],
-                question['translatedTitle']
-            ))
-        self.cur.executemany('''
-INSERT INTO question VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', data)
-        self.conn.commit()
+            data.append(tuple(None if column == 'topicTags' else getattr(question, column)
+                              for column in QUESTION_COLUMNS[:-1]) + (question.extra and json.dumps(question.extra),))
+            for tag in question.topicTags or ():
+                tags.append((question.questionId, tag['name'], tag.get('slug'), tag.get('translatedName')))
+        with self.conn:
+            self.cur.executemany('''
+INSERT INTO question VALUES (%s)
+ON CONFLICT (questionId) DO UPDATE SET %s''' % (', '.join('?' * len(QUESTION_COLUMNS)), ', '.join(
+                '`%s` = excluded.`%s`' % (c, c) for c in QUESTION_COLUMNS)), data)
+            self.cur.executemany('DELETE FROM question_tag WHERE questionId = ?',
+                                 [(question.questionId,) for question in questions])
+            self.cur.executemany('INSERT OR REPLACE INTO question_tag VALUES (?, ?, ?, ?)', tags)
+            if fields is None:
+                self.cur.executemany('DELETE FROM question_fields WHERE questionId = ?',
+                                     [(question.questionId,) for question in questions])
+            else:
+                self.cur.executemany('INSERT OR REPLACE INTO question_fields VALUES (?, ?)',
+                                     [(question.questionId, ','.join(fields)) for question in questions])
 
-    def get_submissions(self):
-        self.cur.execute('''SELECT * FROM submission''')
-        return self.cur.fetchall()
+    def update_frontend_ids(self, questions):
+        with self.conn:
+            self.cur.executemany('UPDATE question SET questionFrontendId = ? WHERE questionId = ?',
+                                 [(question.questionFrontendId, question.questionId) for question in questions])
+
+    def save_solutions(self, solutions):
+        """Replace the stored solutions of the questions in `solutions`, a dict of slug -> list of solutions"""
+        with self.conn:
+            self.cur.executemany('DELETE FROM solution WHERE title_slug = ?', [(slug,) for slug in solutions])
+            data = []
+            for slug, solution_list in solutions.items():
+                for position, solution in enumerate(solution_list):
+                    data.append((solution.submission_id, slug, position) +
+                                tuple(getattr(solution, column) for column in SOLUTION_COLUMNS))
+            self.cur.executemany('INSERT OR REPLACE INTO solution VALUES (%s)' % ', '.join(
+                '?' * (len(SOLUTION_COLUMNS) + 3)), data)
+        self.writes += 1
+        if self.writes % CHECKPOINT_WRITES == 0:
+            self.checkpoint()
+
+    @staticmethod
+    def submission_columns(with_code=False):
+        """Select list of the submission fields, the code is NULL unless `with_code`"""
+        return ', '.join(c if with_code or c != 'code' else 'NULL' for c in SUBMISSION_COLUMNS)
+
+    def iter_submissions(self, until=None, with_code=False, batch_size=500):
+        """
+        Generate submissions newest first, their code is `None` unless `with_code`.
+        `until` is a submission, only it and the ones older than it are generated.
+        """
+        sql = 'SELECT %s FROM submission' % self.submission_columns(with_code)
+        params = ()
+        if until is not None:
+            sql += ' WHERE timestamp < ? OR (timestamp = ? AND id <= ?)'
+            params = (until.timestamp, until.timestamp, until.id)
+        sql += ' ORDER BY timestamp DESC, id DESC'
+        # a cursor of its own, other queries may run while the generator is suspended
+        cur = self.conn.cursor()
+        try:
+            cur.execute(sql, params)
+            rows = cur.fetchmany(batch_size)
+            while rows:
+                for row in rows:
+                    yield Submission.from_row(row)
+                rows = cur.fetchmany(batch_size)
+        finally:
+            cur.close()
+
+    def get_submission(self, submission_id):
+        """The submission without its code, `None` if it is not cached"""
+        row = self.cur.execute('SELECT %s FROM submission WHERE id = ?' % self.submission_columns(),
+                               (submission_id,)).fetchone()
+        return None if row is None else Submission.from_row(row)
+
+    def get_submission_code(self, submission_id):
+        row = self.cur.execute('SELECT code FROM submission WHERE id = ?', (submission_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def max_submission_id(self):
+        return self.cur.execute('SELECT MAX(id) FROM submission').fetchone()[0]
 
     def get_questions(self):
-        self.cur.execute('''SELECT * FROM question''')
-        return self.cur.fetchall()
+        """Cached questions, `topicTags` are the names of their tags"""
+        question_tags = self.get_question_tags()
+        questions = []
+        for row in self.cur.execute('SELECT %s FROM question' % ', '.join('`%s`' % c for c in QUESTION_COLUMNS)):
+            question = Question.from_row(row)
+            question.topicTags = question_tags[question.questionId]
+            question.extra = question.extra and json.loads(question.extra)
+            questions.append(question)
+        return questions
+
+    def get_question_fields(self):
+        """
+        questionId -> fields it was fetched with, for the questions not fetched with exactly
+        `leetcode.QUESTION_FIELDS`, e.g. some of them or more of `fetch.question_fields`
+        """
+        return {question_id: set(fields.split(','))
+                for question_id, fields in self.cur.execute('SELECT questionId, fields FROM question_fields')}
+
+    def get_question_tags(self):
+        """questionId -> names of its tags"""
+        tags = defaultdict(list)
+        for question_id, name in self.cur.execute('SELECT questionId, name FROM question_tag ORDER BY rowid'):
+            tags[question_id].append(name)
+        return tags
+
+    def get_solutions(self):
+        """slug -> list of solutions in their order"""
+        solutions = defaultdict(list)
+        self.cur.execute('SELECT submission_id, title_slug, %s FROM solution ORDER BY title_slug, position' %
+                         ', '.join(SOLUTION_COLUMNS))
+        for row in self.cur.fetchall():
+            solutions[row[1]].append(Solution.from_row(row))
+        return solutions
+
+    def save_question_index(self, entries, updated):
+        """Replace the question index with `entries`, downloaded at time `updated`"""
+        with self.conn:
+            self.cur.execute('DELETE FROM question_index')
+            self.cur.executemany('INSERT OR REPLACE INTO question_index VALUES (?, ?, ?, ?, ?, ?)', [
+                tuple(getattr(entry, column) for column in CATALOG_COLUMNS) + (updated,) for entry in entries])
+
+    def get_question_index(self):
+        """Entries of the question index and the time it was downloaded, `None` if it never was"""
+        rows = self.cur.execute('SELECT %s, updated FROM question_index' % ', '.join(CATALOG_COLUMNS)).fetchall()
+        return [CatalogEntry.from_row(row[:-1]) for row in rows], max((row[-1] for row in rows), default=None)
@@ -0,0 +1,85 @@
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class GitDeployer:
+    """Commit the changes of folder "repo" on top of its history and push them to every remote"""
+
+    def __init__(self, repo, remotes, branch='master', force=False, log=print):
+        self.repo = repo
+        self.remotes = remotes
+        self.branch = branch
+        self.force = force
+        self.log = log
+
+    def run(self, *args):
+        """Run a git command in the repository, return (exit code, output)"""
+        start = time.time()
+        proc = subprocess.run(('git',) + args, cwd=self.repo, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output = proc.stdout.decode('utf-8', 'ignore').strip()
+        self.log('git %s (%.2fs)' % (' '.join(args), time.time() - start))
+        return proc.returncode, output
+
+    def git(self, *args):
+        """Run a git command in the repository, return (ok, output)"""
+        code, output = self.run(*args)
+        return code == 0, output
+
+    def init(self):
+        """
+        Create the working clone, based on the history of the first remote if the branch exists there.
+        If the remote cannot be read, nothing is created, a clone not based on its history could not be pushed.
+        """
+        if os.path.isdir(os.path.join(self.repo, '.git')):
+            return True
+        ok, output = self.git('init', '-q')
+        if ok:
+            # exit code 2: the remote has no such branch, the history starts here
+            code, output = self.run('ls-remote', '--exit-code', '--heads', self.remotes[0], self.branch)
+            ok = code in (0, 2)
+            if code == 0:
+                ok, output = self.git('fetch', '-q', self.remotes[0], self.branch)
+                if ok:
+                    # keep the rendered files, only move HEAD onto the remote history
+                    ok, output = self.git('reset', '-q', 'FETCH_HEAD')
+        if not ok:
+            self.log("Get error when reading '%s': %s" % (self.remotes[0], output))
+            shutil.rmtree(os.path.join(self.repo, '.git'), ignore_errors=True)
+        return ok
+
+    def commit(self, message='Auto Deployment'):
+        """Commit changed files, return False if nothing changed"""
+        self.git('add', '-A')
+        if self.git('diff', '--cached', '--quiet')[0]:
+            self.log('Nothing changed')
+            return False
+        ok, output = self.git('commit', '-q', '-m', message)
+        if not ok:
+            raise RuntimeError(output)
+        return True
+
+    def push(self, remote):
+        args = ['push', '-q', remote, 'HEAD:%s' % self.branch]
+        if self.force:
+            args.insert(1, '-f')
+        ok, output = self.git(*args)
+        if not ok:
+            self.log("Get error when push to '%s': %s" % (remote, output))
+        return ok
+
+    def deploy(self):
+        start = time.time()
+        if not self.init():
+            return False
+        try:
+            self.commit()
+        except RuntimeError as e:
+            self.log('Get error when commit: %s' % e)
+            return False
+        with ThreadPoolExecutor(max_workers=len(self.remotes)) as executor:
+            ok = all(list(executor.map(self.push, self.remotes)))
+        self.log('Deployed in %.2fs' % (time.time() - start))
+        return ok
@@ -0,0 +1,76 @@
+import json
+import re
+
+_PAGE_DATA = re.compile(r'var pageData = \{\n(.*?)\n\s*\};', re.S)
+# one `key: 'value',` line of the pageData object literal
+_PAGE_DATA_FIELD = re.compile(r"^\s*(\w+): '(.*)',?$", re.M)
+_TITLE = re.compile(r'<a class="inline-wrap" href="\S+?">(.+?)</a>')
+_MEMORY = re.compile(r'\d+(?:\.\d+)* \S*B$')
+_TITLE_SLUG = re.compile(r'/problems/(\S+?)/')
+_NOTES = re.compile(r"^\s*notes: JSON\.parse\('(.*)'\)\s*$", re.M)
+_SURROGATE = re.compile('[\ud800-\udfff]')
+
+
+def unescape(s):
+    """Decode the \\uXXXX escapes of a javascript string in one pass"""
+    parts = s.split('\\u')
+    if len(parts) == 1:
+        return s
+    chunks = [parts[0]]
+    for part in parts[1:]:
+        try:
+            chunks.append(chr(int(part[:4], 16)))
+        except ValueError:
+            chunks.append('\\u' + part)
+            continue
+        chunks.append(part[4:])
+    s = ''.join(chunks)
+    if _SURROGATE.search(s):
+        # characters outside the BMP are escaped as surrogate pairs
+        s = s.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+    return s
+
+
+def page_data(html):
+    """The `key: 'value'` fields of the pageData script block, and the position of the block"""
+    m = _PAGE_DATA.search(html)
+    if m is None:
+        raise ValueError('pageData not found in the page')
+    return dict(_PAGE_DATA_FIELD.findall(m.group(1))), m.start()
+
+
+def submission_detail(html):
+    """
+    Fields of a submission detail page: title, runtime, memory, language, code, title_slug and
+    runtime_distribution, the optional ones are `None` if not found.
+    """
+    data, start = page_data(html)
+    title = _TITLE.search(html, 0, start) or _TITLE.search(html, start)
+    runtime = data.get('runtime')
+    memory = data.get('memory')
+    title_slug = _TITLE_SLUG.search(data.get('editCodeUrl', ''))
+    try:
+        language = data['getLangDisplay']
+        code = data['submissionCode']
+    except KeyError as e:
+        raise ValueError('%s not found in the submission detail page' % e)
+    if title_slug is None:
+        raise ValueError('editCodeUrl not found in the submission detail page')
+    runtime_distribution = data.get('runtimeDistributionFormatted')
+    return {
+        'title': title and title.group(1),
+        'runtime': int(runtime) if runtime and runtime.isdigit() else None,
+        'memory': memory if memory and _MEMORY.match(memory) else None,
+        'language': language,
+        'code': unescape(code),
+        'title_slug': title_slug.group(1),
+        'runtime_distribution': json.loads(unescape(runtime_distribution)) if runtime_distribution else None,
+    }
+
+
+def notes(html):
+    """Notes embedded in the notes page"""
+    m = _NOTES.search(html)
+    if m is None:
+        raise ValueError('notes not found in the notes page')
+    return json.loads(unescape(m.group(1)))
@@ -0,0 +1,128 @@
+"""
+Whether a scheduled run has anything to publish, found out before the modules of a full run (yaml aside, the
+settings are in it) are imported, with the standard library and the session kept in _cache/session.json.
+Nothing is new if the newest submission is not newer than _cache/submission_offset.txt, the notes are the ones
+published and the settings, templates, source files and code are the ones of the last published run, see `MARKER`.
+Any doubt, e.g. an expired session or a failed request, means a full run.
+"""
+import hashlib
+import json
+import os
+import time
+import urllib.parse
+import urllib.request
+
+import extract
+from leetcode import User
+from session import SessionStore
+
+# file in _cache with the `inputs_digest` and the digest of the notes of the last published run
+MARKER = 'fastpath.json'
+# folders of LP_PREFIX whose files change the output
+INPUT_FOLDERS = ('src', 'templ', '_source')
+TIMEOUT = 10
+
+
+def digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def inputs_digest(conf, prefix):
+    """Digest of `conf` and of the size and time of the files in `INPUT_FOLDERS` of `prefix`"""
+    files = []
+    for folder in INPUT_FOLDERS:
+        for root, dirs, names in os.walk(os.path.join(prefix, folder)):
+            dirs[:] = sorted(name for name in dirs if name != '__pycache__')
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files.append((os.path.relpath(path, prefix), stat.st_size, stat.st_mtime_ns))
+    return digest([conf, files])
+
+
+def load_json(filename):
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def submission_offset(cache_dir):
+    """Id of the newest submission published, `None` if unknown"""
+    try:
+        with open(os.path.join(cache_dir, 'submission_offset.txt'), 'r', encoding='utf8') as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+class Client:
+    """Requests of a saved session, see `User.session_state`"""
+
+    def __init__(self, domain, state):
+        self.domain = domain
+        now = time.time()
+        self.cookies = {cookie['name']: cookie['value'] for cookie in state['cookies']
+                        if cookie['expires'] is None or cookie['expires'] > now}
+        self.newrelic_id = state.get('x-newrelic-id', '')
+
+    @property
+    def logged_in(self):
+        return User.SESSION_COOKIE in self.cookies and 'csrftoken' in self.cookies
+
+    def get(self, path, params=None, referer=None):
+        url = self.domain + path
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        request = urllib.request.Request(url, headers={
+            'Cookie': '; '.join('%s=%s' % item for item in self.cookies.items()),
+            'Referer': referer or url,
+            'X-CSRFToken': self.cookies['csrftoken'],
+            'X-NewRelic-ID': self.newrelic_id,
+        })
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as r:
+            if r.geturl() != url:
+                # redirected to the login page
+                raise ValueError('session expired')
+            return r.read().decode('utf-8')
+
+    def newest_submission_id(self):
+        j = json.loads(self.get('/api/submissions/', {'offset': 0, 'limit': 1, 'lastkey': ''},
+                                referer=self.domain + '/submissions/'))
+        return max((sd['id'] for sd in j['submissions_dump']), default=None)
+
+    def notes(self):
+        return extract.notes(self.get('/notes/'))
+
+
+def unchanged(conf, prefix):
+    """Whether a run of `conf` in `prefix` would publish nothing new, checked with two small requests at most"""
+    account = conf.get('account') or {}
+    if not (conf.get('fetch') or {}).get('fast_path', True) or not account.get('remember', True):
+        return False
+    cache_dir = os.path.join(prefix, '_cache')
+    marker = load_json(os.path.join(cache_dir, MARKER))
+    offset = submission_offset(cache_dir)
+    if not marker or offset is None or marker.get('inputs') != inputs_digest(conf, prefix):
+        return False
+    domain = {'en': User.DOMAIN_EN, 'cn': User.DOMAIN_CN}.get(str(account.get('domain', 'en')).lower())
+    if domain is None:
+        return False
+    state = SessionStore(os.path.join(cache_dir, 'session.json')).load(domain, account.get('user'))
+    if not state:
+        return False
+    client = Client(domain, state)
+    if not client.logged_in:
+        return False
+    try:
+        newest_id = client.newest_submission_id()
+        # no submission at all while some were published, e.g. logged out, is doubt too
+        if newest_id is None or newest_id > offset:
+            return False
+        # `None` if the templates do not show the notes, they are not fetched then
+        if marker.get('notes') is not None and digest(client.notes()) != marker['notes']:
+            return False
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+    return True
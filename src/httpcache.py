@@ -0,0 +1,132 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Seconds a response is used without asking the server, after that it is revalidated with its ETag / Last-Modified.
+# Summary and notes change whenever something is solved or written, so they are always revalidated.
+DEFAULT_TTLS = {
+    'summary': 0,
+    'notes': 0,
+    'questions': 7 * 24 * 3600,
+}
+
+
+class CacheEntry:
+    __slots__ = ('status', 'headers', 'body', 'stored')
+
+    def __init__(self, status, headers, body, stored):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.stored = stored
+
+    def validators(self):
+        """Headers of a conditional request for this response"""
+        headers = {}
+        if self.headers.get('ETag'):
+            headers['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+    def response(self, url):
+        import requests
+        from requests.structures import CaseInsensitiveDict
+        r = requests.Response()
+        r.status_code = self.status
+        r.headers = CaseInsensitiveDict(self.headers)
+        r._content = self.body
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+        r.url = url
+        return r
+
+
+class ResponseCache:
+    """
+    Responses of the cacheable endpoints, see `DEFAULT_TTLS`, in an SQLite database.
+    The least recently used responses are evicted when they take more than `max_bytes`.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, ttls=None):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = self.revalidated = self.misses = 0
+        with self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+CREATE TABLE IF NOT EXISTS response (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT,
+    status INTEGER,
+    headers TEXT,
+    body BLOB,
+    size INTEGER,
+    stored REAL,
+    accessed REAL
+)''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS response_accessed ON response (accessed)')
+
+    @staticmethod
+    def key(method, url, kwargs):
+        """Requests are the same if their method, url, params and body are"""
+        body = json.dumps([method.upper(), url, kwargs.get('params'), kwargs.get('data'), kwargs.get('json')],
+                          sort_keys=True)
+        return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+    def ttl(self, endpoint):
+        return self.ttls.get(endpoint, 0)
+
+    def fresh(self, endpoint, entry):
+        """Whether `entry` can be used without asking the server"""
+        if time.time() - entry.stored < self.ttl(endpoint):
+            with self.lock:
+                self.hits += 1
+            return True
+        return False
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT status, headers, body, stored FROM response WHERE key = ?',
+                                    (key,)).fetchone()
+            if row is None:
+                return None
+            with self.conn:
+                self.conn.execute('UPDATE response SET accessed = ? WHERE key = ?', (time.time(), key))
+        return CacheEntry(row[0], json.loads(row[1]), row[2], row[3])
+
+    def put(self, key, endpoint, response):
+        # only what is needed to rebuild the response, not hop-by-hop headers
+        headers = {name: response.headers[name] for name in ('Content-Type', 'ETag', 'Last-Modified')
+                   if name in response.headers}
+        body = response.content
+        now = time.time()
+        with self.lock, self.conn:
+            self.misses += 1
+            self.conn.execute('INSERT OR REPLACE INTO response VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                              (key, endpoint, response.status_code, json.dumps(headers), body, len(body), now, now))
+            self.evict()
+
+    def touch(self, key):
+        """The server has confirmed the response has not changed"""
+        with self.lock, self.conn:
+            self.revalidated += 1
+            self.conn.execute('UPDATE response SET stored = ? WHERE key = ?', (time.time(), key))
+
+    def evict(self):
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM response').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        keys = []
+        for key, size in self.conn.execute('SELECT key, size FROM response ORDER BY accessed').fetchall():
+            if total <= self.max_bytes:
+                break
+            keys.append((key,))
+            total -= size
+        self.conn.executemany('DELETE FROM response WHERE key = ?', keys)
+
+    def close(self):
+        self.conn.close()
@@ -1,17 +1,70 @@
 import json
 import re
+import threading
 import time
 from functools import partial
 
-import requests
-from requests.adapters import HTTPAdapter
+import extract
+from metrics import endpoint_of
+from throttle import RETRYABLE_STATUS, Throttle, backoff, retry_after
+
+
+# Fields of `question(titleSlug)` stored by `Dao` and used by the default templates,
+# nested fields are written as "parent.child"
+QUESTION_FIELDS = (
+    'questionId',
+    'questionFrontendId',
+    'title',
+    'titleSlug',
+    'content',
+    'translatedTitle',
+    'translatedContent',
+    'difficulty',
+    'likes',
+    'dislikes',
+    'similarQuestions',
+    'topicTags.name',
+    'topicTags.slug',
+    'topicTags.translatedName',
+    'stats',
+    'status',
+)
+
+
+def selection_set(fields, indent=4):
+    """Build a GraphQL selection set from field paths like ('title', 'topicTags.name')"""
+    children = {}
+    for field in fields:
+        name, _, child = field.partition('.')
+        children.setdefault(name, [])
+        if child:
+            children[name].append(child)
+    lines = []
+    for name, child in children.items():
+        if child:
+            lines.append('%s%s {\n%s%s}' % (' ' * indent, name, selection_set(child, indent + 2), ' ' * indent))
+        else:
+            lines.append(' ' * indent + name)
+    return ''.join(line + '\n' for line in lines)
 
 
 # noinspection PyPep8Naming
 class GraphqlAPI:
     @staticmethod
-    def getQuestionDetail(titleSlug):
-        return '{"operationName":"questionData","variables":{"titleSlug":"%s"},"query":"query questionData($titleSlug: String!) {\\n  question(titleSlug: $titleSlug) {\\n    questionId\\n    questionFrontendId\\n    boundTopicId\\n    title\\n    titleSlug\\n    content\\n    translatedTitle\\n    translatedContent\\n    isPaidOnly\\n    difficulty\\n    likes\\n    dislikes\\n    isLiked\\n    similarQuestions\\n    contributors {\\n      username\\n      profileUrl\\n      avatarUrl\\n      __typename\\n    }\\n    langToValidPlayground\\n    topicTags {\\n      name\\n      slug\\n      translatedName\\n      __typename\\n    }\\n    companyTagStats\\n    codeSnippets {\\n      lang\\n      langSlug\\n      code\\n      __typename\\n    }\\n    stats\\n    hints\\n    solution {\\n      id\\n      canSeeDetail\\n      __typename\\n    }\\n    status\\n    sampleTestCase\\n    metaData\\n    judgerAvailable\\n    judgeType\\n    mysqlSchemas\\n    enableRunCode\\n    enableTestMode\\n    envInfo\\n    libraryUrl\\n    __typename\\n  }\\n}\\n"}' % titleSlug
+    def getQuestionDetail(titleSlug, fields=QUESTION_FIELDS):
+        query = 'query questionData($titleSlug: String!) {\n  question(titleSlug: $titleSlug) {\n%s  }\n}\n' % (
+            selection_set(fields))
+        return json.dumps({'operationName': 'questionData', 'variables': {'titleSlug': titleSlug}, 'query': query})
+
+    @staticmethod
+    def getQuestionDetails(titleSlugs, fields=QUESTION_FIELDS):
+        """Details of many questions in one document, the question of `titleSlugs[i]` is aliased as `q<i>`"""
+        selections = selection_set(fields)
+        query = 'query questionsData(%s) {\n%s}\n' % (
+            ', '.join('$s%d: String!' % i for i in range(len(titleSlugs))),
+            ''.join('  q%d: question(titleSlug: $s%d) {\n%s  }\n' % (i, i, selections) for i in range(len(titleSlugs))))
+        return json.dumps({'operationName': 'questionsData',
+                           'variables': {'s%d' % i: slug for i, slug in enumerate(titleSlugs)}, 'query': query})
 
     @staticmethod
     def getLikesAndFavorites(titleSlug):
@@ -36,22 +89,47 @@ class GraphqlAPI:
 class User:
     DOMAIN_EN = 'https://leetcode.com'
     DOMAIN_CN = 'https://leetcode-cn.com'
+    LOGIN_PATH = '/accounts/login/'
+    SESSION_COOKIE = 'LEETCODE_SESSION'
 
-    def __init__(self, domain):
+    def __init__(self, domain, cache=None, metrics=None):
         self.__domain = domain
+        # `httpcache.ResponseCache` of the summary, notes and questions, `None` means always download them
+        self.cache = cache
+        # `metrics.Metrics` the requests are counted in
+        self.metrics = metrics
+        # imported here, only runs that have something to publish need it, see `fastpath`
+        import requests
+        from requests.adapters import HTTPAdapter
         self.__options = {}
         self.__variables = {'lastkey': '', 'x-newrelic-id': ''}
         self.sess = requests.Session()
         self.sess.mount('https://', HTTPAdapter(max_retries=5))
         self.sess.request = partial(self.sess.request, timeout=(3.05, 27))
+        self.throttle = Throttle.of(domain)
+        # user name and password, and the `session.SessionStore` the session is saved in, see `login`
+        self.__credentials = None
+        self.__store = None
+        self.__login_lock = threading.Lock()
         self.set_options()
 
-    def set_options(self, retry_span=3, retry_times=100, long_wait=60, turn_long_wait_cnt=3, mute_print=False):
+    def set_options(self, retry_span=1, retry_times=10, long_wait=60, retry_budget=None, mute_print=False,
+                    rate=None):
+        """
+        retry_span: base of the exponential backoff in seconds
+        retry_times: max attempts of a single request
+        long_wait: max backoff in seconds
+        retry_budget: max retries shared by all requests to this domain, refilled by successful requests
+        rate: max requests per second to this domain, `None` means no limit
+        """
+        if rate is not None:
+            self.throttle.bucket.set_rate(rate)
+        if retry_budget is not None:
+            self.throttle.budget.set_capacity(retry_budget)
         self.__options.update({
             'retry_span': retry_span,
             'retry_times': retry_times,
             'long_wait': long_wait,
-            'turn_long_wait_cnt': turn_long_wait_cnt,
             'mute_print': mute_print,
         })
 
@@ -62,48 +140,168 @@ class User:
     @property
     def csrftoken(self):
         if 'csrftoken' not in self.sess.cookies:
+            start = time.perf_counter()
             r = self.sess.get(self.domain + '/')
+            if self.metrics:
+                self.metrics.request('/', time.perf_counter() - start, len(r.content), r.status_code)
             xpid = re.findall(r'xpid:"(\w+=*)"', r.text)
             if xpid:
                 self.__variables['x-newrelic-id'] = xpid[0]
         return self.sess.cookies.get('csrftoken')
 
-    def request(self, method, url, **kwargs):
+    @property
+    def session_id(self):
+        return next((cookie.value for cookie in self.sess.cookies if cookie.name == self.SESSION_COOKIE), None)
+
+    def session_state(self):
+        """What is needed to continue the session in another run"""
+        return {
+            'cookies': [{'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path,
+                         'expires': cookie.expires, 'secure': cookie.secure} for cookie in self.sess.cookies],
+            'x-newrelic-id': self.__variables['x-newrelic-id'],
+        }
+
+    def restore_session(self, state):
+        """Continue a session saved by `session_state`, return False if there is none or it has expired"""
+        if not state:
+            return False
+        self.sess.cookies.clear()
+        for cookie in state['cookies']:
+            self.sess.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie['path'],
+                                  expires=cookie['expires'], secure=cookie['secure'])
+        self.sess.cookies.clear_expired_cookies()
+        self.__variables['x-newrelic-id'] = state.get('x-newrelic-id', '')
+        return self.session_id is not None and 'csrftoken' in self.sess.cookies
+
+    def save_session(self):
+        if self.__store is not None and self.__credentials:
+            self.__store.save(self.domain, self.__credentials[0], self.session_state())
+
+    def redirected_to_login(self, r):
+        """Whether `r` is the login page LeetCode redirects to once a session is revoked, cookies still valid"""
+        return bool(r.history) and r.url.startswith(self.domain + self.LOGIN_PATH)
+
+    def request(self, method, url, cache=None, **kwargs):
+        """`cache` is the endpoint of a cacheable response, see `httpcache.DEFAULT_TTLS`"""
         if not url.startswith('http'):
             url = self.domain + url
         head = {'referer': url, 'x-csrftoken': self.csrftoken, 'x-newrelic-id': self.__variables['x-newrelic-id']}
         if 'headers' in kwargs:
             head.update(kwargs['headers'])
             del kwargs['headers']
-        span_cnt = 0
-        for _ in range(self.__options['retry_times']):
+        cache_key, entry = None, None
+        if cache and self.cache:
+            cache_key = self.cache.key(method, url, kwargs)
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                if self.cache.fresh(cache, entry):
+                    return entry.response(url)
+                head.update(entry.validators())
+        bucket, budget = self.throttle.bucket, self.throttle.budget
+        logging_in = url.startswith(self.domain + self.LOGIN_PATH)
+        reauthenticated = logging_in or not self.__credentials
+        for attempt in range(self.__options['retry_times']):
+            bucket.acquire()
+            session_id = self.session_id
+            start = time.perf_counter()
             r = self.sess.request(method, url, headers=head, **kwargs)
-            if r.ok:
+            if self.metrics:
+                self.metrics.request(endpoint_of(url, kwargs.get('json')), time.perf_counter() - start,
+                                     len(r.content), r.status_code)
+            rejected = r.status_code in (401, 403) or (not logging_in and self.redirected_to_login(r))
+            if r.ok and not rejected:
+                bucket.recover()
+                budget.refund()
+                if cache_key is not None:
+                    if r.status_code == 304 and entry is not None:
+                        self.cache.touch(cache_key)
+                        return entry.response(url)
+                    self.cache.put(cache_key, cache, r)
                 return r
-            else:
-                span_cnt += 1
-                if span_cnt % self.__options['turn_long_wait_cnt'] == 0:
-                    for t in range(self.__options['long_wait'], 0, -1):
-                        if not self.__options['mute_print']:
-                            print('\rError %d, Wait for %d seconds...    ' % (r.status_code, t), end='', flush=True)
-                        time.sleep(1)
-                    if not self.__options['mute_print']:
-                        print()
-                else:
-                    time.sleep(self.__options['retry_span'])
-        raise requests.HTTPError
-
-    def login(self, user, password):
+            if rejected and not reauthenticated:
+                # the session has expired or has been revoked, log in again once
+                reauthenticated = True
+                if self.metrics:
+                    self.metrics.count('relogins')
+                if self.reauthenticate(session_id):
+                    head.update({'x-csrftoken': self.csrftoken, 'x-newrelic-id': self.__variables['x-newrelic-id']})
+                    continue
+            if r.status_code not in RETRYABLE_STATUS or not budget.spend():
+                break
+            wait = retry_after(r)
+            if wait is None:
+                wait = backoff(attempt, self.__options['retry_span'], self.__options['long_wait'])
+            if r.status_code == 429:
+                # slow down every thread, not only this one
+                bucket.throttle()
+                bucket.pause(wait)
+            if self.metrics:
+                self.metrics.retry(endpoint_of(url, kwargs.get('json')))
+            if not self.__options['mute_print']:
+                print('\rError %d, Wait for %.1f seconds...    ' % (r.status_code, wait), flush=True)
+            time.sleep(wait)
+        if not logging_in and self.redirected_to_login(r):
+            import requests
+            raise requests.HTTPError('Redirected to the login page, the session is rejected', response=r)
+        r.raise_for_status()
+
+    def login(self, user, password, store=None):
+        """Log in, unless the session of `user` saved in `store` is still accepted"""
+        import requests
+        self.__credentials = (user, password)
+        self.__store = store
+        if store is not None and self.restore_session(store.load(self.domain, user)):
+            # the cookies may not have expired while the session is revoked, `request` logs in again then
+            try:
+                self.submissions_window(0, 1)
+                return True
+            except requests.RequestException:
+                pass
+        return self.__login()
+
+    def __login(self):
+        self.sess.cookies.clear()
+        user, password = self.__credentials
         data = {'login': user, 'password': password}
-        r = self.request('POST', self.domain + '/accounts/login/', data=data)
+        r = self.request('POST', self.domain + self.LOGIN_PATH, data=data)
+        if r.ok:
+            self.save_session()
         return r.ok
 
-    def graphql(self, payload):
-        r = self.request('POST', self.domain + '/graphql', json=json.loads(payload))
+    def reauthenticate(self, session_id):
+        """Log in again after session `session_id` is rejected, unless another thread has already done it"""
+        import requests
+        with self.__login_lock:
+            if self.session_id != session_id:
+                return True
+            try:
+                return self.__login()
+            except requests.HTTPError:
+                return False
+
+    def graphql(self, payload, cache=None):
+        r = self.request('POST', self.domain + '/graphql', cache=cache, json=json.loads(payload))
         return r.json()
 
-    def question(self, title_slug):
-        return self.graphql(GraphqlAPI.getQuestionDetail(title_slug))['data']['question']
+    def all_questions(self):
+        """Title, slug, frontend id, difficulty... of every question, in one response"""
+        return self.graphql(GraphqlAPI.allQuestions())['data']['allQuestions']
+
+    def question(self, title_slug, fields=QUESTION_FIELDS):
+        return self.graphql(GraphqlAPI.getQuestionDetail(title_slug, fields), 'questions')['data']['question']
+
+    def questions(self, title_slugs, batch_size=20, fields=QUESTION_FIELDS, cache='questions'):
+        """
+        Fetch questions `batch_size` at a time, return a dict of slug -> question (`None` if not found).
+        `cache=None` asks the server even if the questions are cached.
+        """
+        questions = {}
+        for i in range(0, len(title_slugs), batch_size):
+            batch = title_slugs[i:i + batch_size]
+            data = self.graphql(GraphqlAPI.getQuestionDetails(batch, fields), cache).get('data') or {}
+            for j, slug in enumerate(batch):
+                questions[slug] = data.get('q%d' % j)
+        return questions
 
     def likes(self, title_slug):
         return self.graphql(GraphqlAPI.getLikesAndFavorites(title_slug))['data']['question']
@@ -111,45 +309,37 @@ class User:
     def submissions(self, page):
         url = self.domain + '/api/submissions/'
         headers = {'referer': self.domain + '/submissions/'}
-        params = {'offset': (page - 1) * 20, 'limit': 20, 'lastkey': self.__variables['lastkey']}
+        # the first page starts over, the user may be kept for several runs
+        params = {'offset': (page - 1) * 20, 'limit': 20, 'lastkey': self.__variables['lastkey'] if page > 1 else ''}
         j = self.request('GET', url, params=params, headers=headers).json()
         self.__variables['lastkey'] = j['last_key']
         return j
 
+    def submissions_window(self, offset, limit=20):
+        """
+        Submissions from `offset`, newest first. Unlike `submissions` it does not depend on the `lastkey` of the
+        previous page, so windows can be fetched concurrently. LeetCode may return fewer than `limit`.
+        """
+        url = self.domain + '/api/submissions/'
+        headers = {'referer': self.domain + '/submissions/'}
+        params = {'offset': offset, 'limit': limit, 'lastkey': ''}
+        return self.request('GET', url, params=params, headers=headers).json()
+
     def solution(self, submission_id):
         url = self.domain + '/submissions/detail/%d/' % submission_id
-        html = self.request('GET', url).text
-        title = re.findall(r'<a class="inline-wrap" href="\S+?">(.+?)</a>', html) or None
-        if title:
-            title = title[0]
-        runtime = re.findall(r"runtime: '(\d+)',", html) or None
-        if runtime:
-            runtime = int(runtime[0])
-        memory = re.findall(r"memory: '(\d+(?:\.\d+)* \S*B)'", html) or None
-        if memory:
-            memory = memory[0]
-        language = re.findall(r"getLangDisplay: '(\S+?)',", html)[0]
-        code = re.findall(r"submissionCode: '(.+?)',\n", html)[0]
-        for ch in set(re.findall(r'\\u\w{4}', code)):
-            code = code.replace(ch, ch.encode('utf-8').decode('unicode-escape'))
-        title_slug = re.findall(r"editCodeUrl: '\S*?/problems/(\S+?)/'", html)[0]
-
-        runtime_distribution = re.findall(r"runtimeDistributionFormatted: '({.*?})'", html)
+        detail = extract.submission_detail(self.request('GET', url).text)
+        runtime = detail['runtime']
         beats = None
-        if runtime_distribution:
-            runtime_distribution = runtime_distribution[0]
-            for ch in set(re.findall(r'\\u\w{4}', runtime_distribution)):
-                runtime_distribution = runtime_distribution.replace(ch, ch.encode('utf-8').decode('unicode-escape'))
-            runtime_distribution = json.loads(runtime_distribution)
-            if runtime is not None:
-                beats = 100
-                for dis in runtime_distribution.get('distribution', []):
-                    if int(dis[0]) < runtime:
-                        beats -= dis[1]
-                beats = round(beats, 2)
-
-        return {'runtime': runtime, 'language': language, 'code': code, 'submission_id': submission_id,
-                'memory': memory, 'beats': beats, 'title_slug': title_slug, 'title': title}
+        if detail['runtime_distribution'] and runtime is not None:
+            beats = 100
+            for dis in detail['runtime_distribution'].get('distribution', []):
+                if int(dis[0]) < runtime:
+                    beats -= dis[1]
+            beats = round(beats, 2)
+
+        return {'runtime': runtime, 'language': detail['language'], 'code': detail['code'],
+                'submission_id': submission_id, 'memory': detail['memory'], 'beats': beats,
+                'title_slug': detail['title_slug'], 'title': detail['title']}
 
     def note(self, arg):
         if isinstance(arg, int):
@@ -166,22 +356,18 @@ class User:
 
     def notes(self):
         url = self.domain + '/notes/'
-        html = self.request('GET', url).text
-        notes = re.findall(r"^\s*notes: JSON\.parse\('(.*)'\)\s*$", html, re.M)[0]
-        for ch in set(re.findall(r'\\u\w{4}', notes)):
-            notes = notes.replace(ch, ch.encode('utf-8').decode('unicode-escape'))
-        return json.loads(notes)
+        return extract.notes(self.request('GET', url, cache='notes').text)
 
     def summary(self):
         url = self.domain + '/api/problems/all/'
-        return self.request('GET', url).json()
+        return self.request('GET', url, cache='summary').json()
 
 
 class UserEN(User):
-    def __init__(self):
-        super().__init__(domain=User.DOMAIN_EN)
+    def __init__(self, cache=None, metrics=None):
+        super().__init__(domain=User.DOMAIN_EN, cache=cache, metrics=metrics)
 
 
 class UserCN(User):
-    def __init__(self):
-        super().__init__(domain=User.DOMAIN_CN)
+    def __init__(self, cache=None, metrics=None):
+        super().__init__(domain=User.DOMAIN_CN, cache=cache, metrics=metrics)
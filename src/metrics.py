@@ -0,0 +1,110 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted `values`"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def endpoint_of(url, payload=None):
+    """Name requests are grouped by, ids in the path are replaced by N and graphql is split by operation"""
+    path = re.sub(r'^\w+://[^/]+', '', url).split('?')[0]
+    name = re.sub(r'\d+', 'N', path)
+    if isinstance(payload, dict) and payload.get('operationName'):
+        name += ' ' + payload['operationName']
+    return name
+
+
+def timed(stage):
+    """Time the decorated method of an object with a `metrics` attribute as `stage`"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.stage(stage):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Metrics:
+    """Stage timings, request statistics and counters of one run"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stages = OrderedDict()
+        self.latencies = defaultdict(list)
+        self.requests = defaultdict(lambda: defaultdict(int))
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - start
+
+    def request(self, endpoint, seconds, size, status):
+        with self.lock:
+            stats = self.requests[endpoint]
+            stats['requests'] += 1
+            stats['bytes'] += size
+            if status >= 400:
+                stats['errors'] += 1
+            self.latencies[endpoint].append(seconds)
+
+    def retry(self, endpoint):
+        with self.lock:
+            self.requests[endpoint]['retries'] += 1
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def report(self):
+        with self.lock:
+            endpoints = {}
+            for endpoint, stats in sorted(self.requests.items()):
+                latencies = sorted(self.latencies[endpoint])
+                endpoints[endpoint] = dict({'requests': 0, 'retries': 0, 'errors': 0, 'bytes': 0}, **stats)
+                endpoints[endpoint].update({
+                    'p50_ms': latencies and round(percentile(latencies, 50) * 1000, 1),
+                    'p90_ms': latencies and round(percentile(latencies, 90) * 1000, 1),
+                    'p99_ms': latencies and round(percentile(latencies, 99) * 1000, 1),
+                    'max_ms': latencies and round(latencies[-1] * 1000, 1),
+                })
+            return {
+                'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+                'seconds': round(time.time() - self.started, 3),
+                'stages': OrderedDict((name, round(seconds, 3)) for name, seconds in self.stages.items()),
+                'endpoints': endpoints,
+                'counters': dict(sorted(self.counters.items())),
+            }
+
+    def filename(self, directory, ext):
+        """File of this run in `directory`, named after the time it started"""
+        return os.path.join(directory, time.strftime('%Y-%m-%d_%H%M%S', time.localtime(self.started)) + ext)
+
+    def dump(self, directory, keep=100):
+        """Write the report to a json file in `directory`, only the `keep` latest reports and profiles are kept"""
+        os.makedirs(directory, exist_ok=True)
+        path = self.filename(directory, '.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        for ext in ('.json', '.prof'):
+            reports = sorted(name for name in os.listdir(directory) if name.endswith(ext))
+            for name in reports[:max(0, len(reports) - keep)]:
+                os.remove(os.path.join(directory, name))
+        return path
@@ -0,0 +1,98 @@
+import queue
+import threading
+
+_END = object()
+
+
+class Inbox:
+    """Bounded queue of the items sent to a stage, iterating it ends when the previous stage is done"""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.done = False
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def close(self):
+        self.queue.put(_END)
+
+    def __iter__(self):
+        while not self.done:
+            item = self.queue.get()
+            if item is _END:
+                self.done = True
+                return
+            yield item
+
+    def batches(self, size):
+        """Lists of at least one and at most `size` items, without waiting for more than the first one"""
+        for item in self:
+            batch = [item]
+            while len(batch) < size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _END:
+                    self.done = True
+                    break
+                batch.append(item)
+            yield batch
+
+
+class Pipeline:
+    """
+    Stages running in threads of their own, connected by bounded queues.
+    A stage is a function taking its `Inbox` and generating the items of the next stage.
+    """
+
+    def __init__(self, queue_size=64):
+        self.queue_size = queue_size
+        self.stages = []
+
+    def add(self, name, func):
+        self.stages.append((name, func))
+        return self
+
+    def run(self, source):
+        """
+        Send the items of `source`, generated in the calling thread, through the stages.
+        Return the items generated by the last stage, raise the first error of a stage once every stage is done.
+        """
+        inboxes = [Inbox(self.queue_size) for _ in self.stages]
+        results = []
+        errors = []
+
+        def work(i, func):
+            try:
+                for item in func(inboxes[i]):
+                    if i + 1 < len(inboxes):
+                        inboxes[i + 1].put(item)
+                    else:
+                        results.append(item)
+            except BaseException as e:
+                errors.append(e)
+                # keep taking items, the previous stage would be blocked by a full queue otherwise
+                for _ in inboxes[i]:
+                    pass
+            finally:
+                if i + 1 < len(inboxes):
+                    inboxes[i + 1].close()
+
+        threads = [threading.Thread(target=work, args=(i, func), name=name, daemon=True)
+                   for i, (name, func) in enumerate(self.stages)]
+        for thread in threads:
+            thread.start()
+        try:
+            for item in source:
+                if errors:
+                    break
+                inboxes[0].put(item)
+        finally:
+            inboxes[0].close()
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+        return results
@@ -0,0 +1,152 @@
+"""
+What the templates use, found in their syntax trees, so that data no template shows is not downloaded.
+A variable used in a way that cannot be followed, e.g. passed to a macro or included templates, counts as
+using all of it.
+"""
+from jinja2 import TemplateNotFound, nodes
+
+from leetcode import QUESTION_FIELDS
+
+# fields every question is fetched with, they name files, sort the README and map titles to slugs
+REQUIRED_QUESTION_FIELDS = ('questionId', 'questionFrontendId', 'title', 'titleSlug')
+# fields of a solution only found in its detail page
+DETAIL_FIELDS = ('beats',)
+# collection -> the variable of its items, in the loops that go through it
+ITEMS = {'questions': 'question', 'solutions': 'solution'}
+
+
+class Usage:
+    """Attributes used of each variable of a template, `None` if all of them may be used"""
+
+    def __init__(self, variables):
+        self.variables = set(variables)
+        self.attrs = {name: set() for name in self.variables}
+        # loop variable -> variable of which it is an item, e.g. `question` of `for question in questions`
+        self.aliases = {}
+
+    def tracked(self, name):
+        return name in self.attrs or name in self.aliases
+
+    def used(self, name):
+        return self.attrs[name] is None or bool(self.attrs[name])
+
+    def use(self, name, attr=None):
+        name = self.aliases.get(name, name)
+        if self.attrs.get(name) is None:
+            return
+        if attr is not None:
+            self.attrs[name].add(attr)
+            return
+        self.attrs[name] = None
+        if ITEMS.get(name) in self.attrs:
+            # e.g. `questions | map(attribute=...)`, any attribute of the items may be used
+            self.attrs[ITEMS[name]] = None
+
+    def visit(self, node):
+        if isinstance(node, (nodes.Include, nodes.Import, nodes.FromImport, nodes.Extends)):
+            # the other template may use anything
+            for name in self.attrs:
+                self.attrs[name] = None
+            return
+        if isinstance(node, nodes.For) and isinstance(node.iter, nodes.Name) and node.iter.name in ITEMS:
+            self.use(node.iter.name, '')
+            if isinstance(node.target, nodes.Name) and ITEMS[node.iter.name] in self.variables:
+                self.aliases[node.target.name] = ITEMS[node.iter.name]
+            else:
+                self.use(ITEMS[node.iter.name])
+            for child in (node.body, node.else_, node.test):
+                self.visit_all(child)
+            return
+        if isinstance(node, (nodes.Getattr, nodes.Getitem)) and isinstance(node.node, nodes.Name):
+            name = node.node.name
+            if self.tracked(name):
+                if isinstance(node, nodes.Getattr):
+                    self.use(name, node.attr)
+                elif isinstance(node.arg, nodes.Const) and isinstance(node.arg.value, str):
+                    self.use(name, node.arg.value)
+                else:
+                    self.use(name)
+                    self.visit(node.arg)
+                return
+        if isinstance(node, nodes.Name) and node.ctx == 'load' and self.tracked(node.name):
+            self.use(node.name)
+            return
+        self.visit_all(node.iter_child_nodes())
+
+    def visit_all(self, children):
+        if children is None:
+            return
+        if isinstance(children, nodes.Node):
+            children = [children]
+        for child in children:
+            self.visit(child)
+
+
+def usage(env, name, variables):
+    """`Usage` of `variables` in template `name`, nothing is used if it does not exist"""
+    result = Usage(variables)
+    try:
+        source = env.loader.get_source(env, name)[0]
+    except TemplateNotFound:
+        return result
+    result.visit(env.parse(source))
+    return result
+
+
+def merge(*attrs):
+    """Union of attribute sets, `None` (all) wins"""
+    merged = set()
+    for a in attrs:
+        if a is None:
+            return None
+        merged |= a
+    return merged
+
+
+class FetchPlan:
+    """
+    What to download for templates using `question_attrs` of questions and `solution_attrs` of solutions
+    (`None` means all of them), and whether they show the notes, the likes and the summary.
+    """
+
+    def __init__(self, question_attrs=None, solution_attrs=None, notes=True, likes=True, summary=True):
+        self.question_attrs = question_attrs
+        self.solution_attrs = solution_attrs
+        self.notes = notes
+        self.likes = likes
+        self.summary = summary
+
+    @property
+    def question_fields(self):
+        """Fields of `QUESTION_FIELDS` the questions are fetched with"""
+        if self.question_attrs is None:
+            return QUESTION_FIELDS
+        return tuple(field for field in QUESTION_FIELDS if field in REQUIRED_QUESTION_FIELDS or
+                     field.partition('.')[0] in self.question_attrs)
+
+    @property
+    def solution_details(self):
+        """Whether solutions need their detail pages, instead of the submissions they are made of"""
+        return self.solution_attrs is None or any(field in self.solution_attrs for field in DETAIL_FIELDS)
+
+    def __repr__(self):
+        fields = self.question_fields
+        flags = [name for name in ('solution details', 'notes', 'likes', 'summary')
+                 if getattr(self, name.replace(' ', '_'))]
+        return 'question fields: %s; %s' % ('all' if fields == QUESTION_FIELDS else ', '.join(fields),
+                                            ', '.join(flags) or 'nothing else')
+
+
+def plan(env):
+    """`FetchPlan` of the templates of `env`, see `RepoGen.render_readme` and `render_job` for their variables"""
+    readme = usage(env, 'README.md.txt', ('questions', 'question', 'likes', 'summary'))
+    question = usage(env, 'question.md.txt', ('question', 'solutions', 'solution', 'note', 'answer'))
+    solution = usage(env, 'solution.txt', ('solution',))
+    return FetchPlan(
+        question_attrs=merge(readme.attrs['question'], question.attrs['question']),
+        solution_attrs=merge(question.attrs['solution'], solution.attrs['solution']),
+        # the answer is made of the note and the solutions pinned in it
+        notes=question.used('note') or question.used('answer'),
+        likes=readme.used('likes'),
+        summary=readme.used('summary'),
+    )
@@ -0,0 +1,158 @@
+"""
+Records passed between `Dao` and `RepoGen`. Fields are attributes, so templates use them like dicts
+(`{{ question.title }}`), and `as_dict` gives the json the render workers and the digests are made of.
+"""
+
+
+class Record:
+    """
+    Fields are `__slots__`, each subclass has an `__init__` taking them in their order, the ones not given are
+    `None`. Assigning each field by name is much faster than a loop of setattr.
+    """
+    __slots__ = ()
+    # whether `as_dict` leaves out the fields that are `None`
+    omit_none = False
+    # records are mutable and compared by value, like the dicts they replace they cannot be hashed
+    __hash__ = None
+
+    @classmethod
+    def from_row(cls, row):
+        """Record of a database row whose values are in the order of the fields"""
+        return cls(*row)
+
+    @classmethod
+    def from_dict(cls, d):
+        """Record of a json object, keys that are not fields are ignored"""
+        return cls(**{name: d[name] for name in cls.__slots__ if name in d})
+
+    def as_dict(self):
+        d = {name: getattr(self, name) for name in self.__slots__}
+        if self.omit_none:
+            d = {name: value for name, value in d.items() if value is not None}
+        return d
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join('%s=%r' % item for item in self.as_dict().items()))
+
+
+class Submission(Record):
+    __slots__ = ('code', 'compare_result', 'id', 'is_pending', 'lang', 'memory', 'runtime', 'status_display',
+                 'timestamp', 'title', 'url')
+
+    def __init__(self, code=None, compare_result=None, id=None, is_pending=None, lang=None, memory=None,
+                 runtime=None, status_display=None, timestamp=None, title=None, url=None):
+        self.code = code
+        self.compare_result = compare_result
+        self.id = id
+        self.is_pending = is_pending
+        self.lang = lang
+        self.memory = memory
+        self.runtime = runtime
+        self.status_display = status_display
+        self.timestamp = timestamp
+        self.title = title
+        self.url = url
+
+
+class Question(Record):
+    """
+    Fields stored in the database, `topicTags` are the names of the tags when loaded from it.
+    Other fields, see `fetch.question_fields`, are kept in `extra` and stored as json.
+    """
+    __slots__ = ('content', 'difficulty', 'dislikes', 'likes', 'questionFrontendId', 'questionId',
+                 'similarQuestions', 'stats', 'status', 'title', 'titleSlug', 'topicTags', 'translatedContent',
+                 'translatedTitle', 'extra')
+
+    def __init__(self, content=None, difficulty=None, dislikes=None, likes=None, questionFrontendId=None,
+                 questionId=None, similarQuestions=None, stats=None, status=None, title=None, titleSlug=None,
+                 topicTags=None, translatedContent=None, translatedTitle=None, extra=None):
+        self.content = content
+        self.difficulty = difficulty
+        self.dislikes = dislikes
+        self.likes = likes
+        self.questionFrontendId = questionFrontendId
+        self.questionId = questionId
+        self.similarQuestions = similarQuestions
+        self.stats = stats
+        self.status = status
+        self.title = title
+        self.titleSlug = titleSlug
+        self.topicTags = topicTags
+        self.translatedContent = translatedContent
+        self.translatedTitle = translatedTitle
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, d):
+        question = super().from_dict(d)
+        question.extra = {name: value for name, value in d.items() if name not in cls.__slots__} or None
+        return question
+
+    def __getattr__(self, name):
+        # only called for names that are not fields
+        if name != 'extra' and self.extra and name in self.extra:
+            return self.extra[name]
+        raise AttributeError(name)
+
+    def as_dict(self):
+        d = super().as_dict()
+        d.update(d.pop('extra') or {})
+        return d
+
+
+class CatalogEntry(Record):
+    """Question of the `allQuestions` index, enough to find its slug and frontend id without fetching it"""
+    __slots__ = ('titleSlug', 'title', 'questionFrontendId', 'difficulty', 'isPaidOnly')
+
+    def __init__(self, titleSlug=None, title=None, questionFrontendId=None, difficulty=None, isPaidOnly=None):
+        self.titleSlug = titleSlug
+        self.title = title
+        self.questionFrontendId = questionFrontendId
+        self.difficulty = difficulty
+        self.isPaidOnly = isPaidOnly
+
+
+class Solution(Record):
+    """Accepted submission shown in the page of its question, `id` is the same as `submission_id`"""
+    __slots__ = ('submission_id', 'title_slug', 'title', 'language', 'lang', 'runtime', 'memory', 'beats', 'code',
+                 'timestamp', 'status_display', 'compare_result', 'is_pending', 'url')
+    omit_none = True
+
+    def __init__(self, submission_id=None, title_slug=None, title=None, language=None, lang=None, runtime=None,
+                 memory=None, beats=None, code=None, timestamp=None, status_display=None, compare_result=None,
+                 is_pending=None, url=None):
+        self.submission_id = submission_id
+        self.title_slug = title_slug
+        self.title = title
+        self.language = language
+        self.lang = lang
+        self.runtime = runtime
+        self.memory = memory
+        self.beats = beats
+        self.code = code
+        self.timestamp = timestamp
+        self.status_display = status_display
+        self.compare_result = compare_result
+        self.is_pending = is_pending
+        self.url = url
+
+    @property
+    def id(self):
+        return self.submission_id
+
+    @classmethod
+    def from_submission(cls, submission, title_slug):
+        # runtime in ms like the detail page, the submission list says '52 ms'
+        runtime = str(submission.runtime).split(' ')[0]
+        return cls(submission.id, title_slug, submission.title, submission.lang, submission.lang,
+                   int(runtime) if runtime.isdigit() else None, submission.memory, None, submission.code,
+                   submission.timestamp, submission.status_display, submission.compare_result, submission.is_pending,
+                   submission.url)
+
+    def as_dict(self):
+        d = super().as_dict()
+        d['id'] = self.submission_id
+        return d
@@ -0,0 +1,41 @@
+import json
+import os
+import threading
+
+
+class SessionStore:
+    """
+    Logged in sessions saved in a json file, so that a run does not have to log in again.
+    A session is the state returned by `User.session_state`, saved under the domain and the user name.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(domain, user):
+        return '%s %s' % (domain, user)
+
+    def sessions(self):
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def load(self, domain, user):
+        with self.lock:
+            return self.sessions().get(self.key(domain, user))
+
+    def save(self, domain, user, state):
+        with self.lock:
+            sessions = self.sessions()
+            sessions[self.key(domain, user)] = state
+            # the cookies are as good as the password, keep them private to the owner
+            tmp_file = self.path + '.tmp'
+            with open(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+                json.dump(sessions, f)
+            os.replace(tmp_file, self.path)
@@ -0,0 +1,120 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Statuses worth another try, anything else fails at once
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+def retry_after(response):
+    """Seconds to wait according to the `Retry-After` header, or `None`"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff(attempt, base=1, cap=60):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Token bucket whose rate is halved when the server pushes back and slowly recovers on success"""
+
+    def __init__(self, rate=None, min_rate=0.2):
+        self.__lock = threading.Lock()
+        self.__tokens = 1.0
+        self.__updated = time.monotonic()
+        self.__paused_until = 0
+        self.max_rate = self.rate = rate
+        self.min_rate = min_rate
+
+    def set_rate(self, rate):
+        with self.__lock:
+            self.max_rate = self.rate = rate
+
+    def acquire(self):
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                if now < self.__paused_until:
+                    wait_time = self.__paused_until - now
+                elif not self.rate:
+                    return
+                else:
+                    self.__tokens = min(1.0, self.__tokens + (now - self.__updated) * self.rate)
+                    self.__updated = now
+                    if self.__tokens >= 1:
+                        self.__tokens -= 1
+                        return
+                    wait_time = (1 - self.__tokens) / self.rate
+            time.sleep(wait_time)
+
+    def pause(self, seconds):
+        """Hold back every request to this domain for `seconds`"""
+        with self.__lock:
+            self.__paused_until = max(self.__paused_until, time.monotonic() + seconds)
+
+    def throttle(self):
+        with self.__lock:
+            if self.rate:
+                self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self):
+        with self.__lock:
+            if self.rate and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RetryBudget:
+    """Retries allowed across all threads; every retry costs one token, every success refunds `ratio`"""
+
+    def __init__(self, capacity=100, ratio=0.1):
+        self.__lock = threading.Lock()
+        self.capacity = self.__tokens = capacity
+        self.ratio = ratio
+
+    def set_capacity(self, capacity):
+        with self.__lock:
+            self.capacity = self.__tokens = capacity
+
+    def spend(self):
+        with self.__lock:
+            if self.__tokens < 1:
+                return False
+            self.__tokens -= 1
+            return True
+
+    def refund(self):
+        with self.__lock:
+            self.__tokens = min(self.capacity, self.__tokens + self.ratio)
+
+
+class Throttle:
+    """Rate limit and retry budget shared by every `User` of the same domain"""
+    _throttles = {}
+    _throttles_lock = threading.Lock()
+
+    def __init__(self):
+        self.bucket = TokenBucket()
+        self.budget = RetryBudget()
+
+    @classmethod
+    def of(cls, domain):
+        with cls._throttles_lock:
+            if domain not in cls._throttles:
+                cls._throttles[domain] = cls()
+            return cls._throttles[domain]
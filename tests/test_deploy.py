@@ -0,0 +1,112 @@
+"""`GitDeployer` against local bare repositories"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+from deploy import GitDeployer  # noqa: E402
+
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'test', 'GIT_AUTHOR_EMAIL': 'test@example.com',
+    'GIT_COMMITTER_NAME': 'test', 'GIT_COMMITTER_EMAIL': 'test@example.com',
+}
+
+
+def git(cwd, *args):
+    return subprocess.run(('git',) + args, cwd=cwd, check=True, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL).stdout.decode('utf-8').strip()
+
+
+class GitDeployerTest(unittest.TestCase):
+    def setUp(self):
+        env = mock.patch.dict(os.environ, GIT_ENV)
+        env.start()
+        self.addCleanup(env.stop)
+        self.tmp = tempfile.mkdtemp(prefix='lp-deploy-')
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.repo = os.path.join(self.tmp, 'repo')
+        os.makedirs(self.repo)
+
+    def remote(self, name='remote.git'):
+        path = os.path.join(self.tmp, name)
+        git(self.tmp, 'init', '-q', '--bare', path)
+        return path
+
+    def write(self, name, text):
+        with open(os.path.join(self.repo, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def deployer(self, *remotes):
+        return GitDeployer(self.repo, list(remotes), log=lambda *args: None)
+
+    def log(self, remote):
+        """Subjects of the commits of branch master of `remote`, newest first"""
+        return git(remote, 'log', '--format=%s', 'master').splitlines()
+
+    def test_first_deploy(self):
+        remote = self.remote()
+        self.write('README.md', 'hello')
+        self.assertTrue(self.deployer(remote).deploy())
+        self.assertEqual(self.log(remote), ['Auto Deployment'])
+        self.assertEqual(git(remote, 'show', 'master:README.md'), 'hello')
+
+    def test_incremental_commit(self):
+        remote = self.remote()
+        self.write('README.md', 'hello')
+        self.assertTrue(self.deployer(remote).deploy())
+        first = git(remote, 'rev-parse', 'master')
+        self.write('README.md', 'hello again')
+        self.assertTrue(self.deployer(remote).deploy())
+        self.assertEqual(len(self.log(remote)), 2)
+        self.assertEqual(git(remote, 'rev-parse', 'master^'), first)
+
+    def test_nothing_changed(self):
+        remote = self.remote()
+        self.write('README.md', 'hello')
+        self.assertTrue(self.deployer(remote).deploy())
+        deployer = self.deployer(remote)
+        self.assertFalse(deployer.commit())
+        self.assertTrue(deployer.deploy())
+        self.assertEqual(len(self.log(remote)), 1)
+
+    def test_existing_remote_history(self):
+        remote = self.remote()
+        other = os.path.join(self.tmp, 'other')
+        git(self.tmp, 'clone', '-q', remote, other)
+        with open(os.path.join(other, 'LICENSE'), 'w', encoding='utf-8') as f:
+            f.write('license')
+        git(other, 'add', '-A')
+        git(other, 'commit', '-q', '-m', 'Existing')
+        git(other, 'push', '-q', 'origin', 'HEAD:master')
+        self.write('README.md', 'hello')
+        self.assertTrue(self.deployer(remote).deploy())
+        self.assertEqual(self.log(remote), ['Auto Deployment', 'Existing'])
+
+    def test_parallel_pushes(self):
+        remotes = [self.remote('remote%d.git' % i) for i in range(3)]
+        self.write('README.md', 'hello')
+        self.assertTrue(self.deployer(*remotes).deploy())
+        heads = {git(remote, 'rev-parse', 'master') for remote in remotes}
+        self.assertEqual(heads, {git(self.repo, 'rev-parse', 'HEAD')})
+
+    def test_unreadable_remote(self):
+        missing = os.path.join(self.tmp, 'missing.git')
+        self.write('README.md', 'hello')
+        self.assertFalse(self.deployer(missing).deploy())
+        self.assertFalse(os.path.exists(os.path.join(self.repo, '.git')))
+        # once the remote can be read, the clone is based on its history
+        remote = self.remote('missing.git')
+        other = os.path.join(self.tmp, 'other')
+        git(self.tmp, 'clone', '-q', remote, other)
+        git(other, 'commit', '-q', '--allow-empty', '-m', 'Existing')
+        git(other, 'push', '-q', 'origin', 'HEAD:master')
+        self.assertTrue(self.deployer(remote).deploy())
+        self.assertEqual(self.log(remote), ['Auto Deployment', 'Existing'])
+
+
+if __name__ == '__main__':
+    unittest.main()
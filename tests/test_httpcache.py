@@ -0,0 +1,101 @@
+"""`ResponseCache` used by `User` against bench/stub_server.py, which sends ETags and answers 304"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+from httpcache import ResponseCache  # noqa: E402
+from leetcode import User  # noqa: E402
+from stub_server import Account, StubServer  # noqa: E402
+
+
+class ResponseCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(('127.0.0.1', 0), Account(20))
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='lp-cache-')
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.cache = self.open_cache()
+
+    def open_cache(self, **kwargs):
+        cache = ResponseCache(os.path.join(self.tmp, 'http.db'), **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def user(self, cache):
+        user = User(self.server.url, cache)
+        user.set_options(retry_times=1, mute_print=True)
+        return user
+
+    def served(self, path):
+        return self.server.stats.get(path, 0)
+
+    def rows(self, cache):
+        return cache.conn.execute('SELECT COUNT(*) FROM response').fetchone()[0]
+
+    def test_fresh_hit_sends_no_request(self):
+        cache = self.open_cache(ttls={'summary': 3600})
+        user = self.user(cache)
+        before = self.served('/api/problems/all/')
+        first = user.summary()
+        self.assertEqual(user.summary(), first)
+        self.assertEqual(self.served('/api/problems/all/') - before, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_not_modified_reuses_body(self):
+        user = self.user(self.cache)
+        before = self.served('/notes/')
+        first = user.notes()
+        self.assertTrue(first)
+        # notes are always revalidated, the stub answers 304 without a body to the ETag sent back
+        self.assertEqual(user.notes(), first)
+        self.assertEqual(self.served('/notes/') - before, 2)
+        self.assertEqual((self.cache.revalidated, self.cache.misses), (1, 1))
+
+    def test_errors_are_not_cached(self):
+        user = self.user(self.cache)
+        with self.assertRaises(requests.HTTPError):
+            user.request('GET', '/missing/', cache='summary')
+        self.assertEqual(self.rows(self.cache), 0)
+        self.assertEqual(self.cache.misses, 0)
+
+    def test_least_recently_used_are_evicted(self):
+        cache = self.open_cache(ttls={'summary': 3600})
+        user = self.user(cache)
+
+        def get(name):
+            return user.request('GET', '/api/problems/all/', cache='summary', params={'name': name})
+
+        size = len(get('a').content)
+        # room for two responses
+        cache.max_bytes = size * 2 + size // 2
+        get('b')
+        # a is used again, b is now the least recently used
+        get('a')
+        get('c')
+        self.assertEqual(self.rows(cache), 2)
+        key = cache.key('GET', self.server.url + '/api/problems/all/', {'params': {'name': 'b'}})
+        self.assertIsNone(cache.get(key))
+        before = self.served('/api/problems/all/')
+        get('a')
+        get('c')
+        self.assertEqual(self.served('/api/problems/all/'), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Saved and revoked sessions of `User` against bench/stub_server.py, which redirects them to the login page"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+from leetcode import User  # noqa: E402
+from session import SessionStore  # noqa: E402
+from stub_server import Account, StubServer  # noqa: E402
+
+
+class SessionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(('127.0.0.1', 0), Account(20), check_sessions=True)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='lp-session-')
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.store = SessionStore(os.path.join(self.tmp, 'session.json'))
+        self.server.sessions.clear()
+
+    def user(self):
+        user = User(self.server.url)
+        user.set_options(retry_times=2, mute_print=True)
+        self.assertTrue(user.login('stub', 'stub', self.store))
+        return user
+
+    def test_saved_session_is_reused(self):
+        first = self.user()
+        second = self.user()
+        self.assertEqual(second.session_id, first.session_id)
+        self.assertEqual(len(self.server.sessions), 1)
+        self.assertTrue(second.notes())
+
+    def test_revoked_saved_session_logs_in_again(self):
+        revoked = self.user().session_id
+        self.server.sessions.clear()
+        user = self.user()
+        self.assertNotEqual(user.session_id, revoked)
+        self.assertIn(user.session_id, self.server.sessions)
+        # the new session is saved for the next run
+        cookies = self.store.load(user.domain, 'stub')['cookies']
+        self.assertIn(user.session_id, [cookie['value'] for cookie in cookies])
+        self.assertTrue(user.notes())
+
+    def test_session_revoked_during_a_run(self):
+        user = self.user()
+        revoked = user.session_id
+        self.server.sessions.clear()
+        self.assertTrue(user.notes())
+        self.assertNotEqual(user.session_id, revoked)
+        self.assertEqual(user.submissions_window(0, 1)['submissions_dump'][0]['id'],
+                         self.server.account.submissions[0]['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()